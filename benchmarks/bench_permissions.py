@@ -0,0 +1,230 @@
+"""
+Microbenchmarks for the permission check path.
+
+    python benchmarks/bench_permissions.py [--output results.json]
+        [--compare baseline.json] [--threshold 1.2]
+
+Prints one JSON object per benchmark with the best time per call in
+nanoseconds. With --compare, benchmarks slower than the baseline by more
+than --threshold are reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graphene_field_permission import api  # noqa: E402
+from graphene_field_permission.decorators import has_field_access  # noqa: E402
+
+
+def permission_names(count, prefix='permission'):
+    return ['{}{}'.format(prefix, i) for i in range(count)]
+
+
+SMALL = permission_names(5)
+LARGE = permission_names(500)
+GROUPED = {
+    'group-{}'.format(group): permission_names(50, 'g{}-permission'.format(
+        group % 10
+    ))
+    for group in range(50)
+}
+GROUPED['group-0'].append('permission1')
+
+SMALL_PERMISSIONS = api.restructure_permissions(SMALL)
+LARGE_PERMISSIONS = api.restructure_permissions(LARGE)
+GROUPED_PERMISSIONS = api.restructure_permissions(GROUPED)
+
+
+def deep_data(depth, value='group-0'):
+    data = SimpleNamespace(id=value)
+    for level in range(depth):
+        data = SimpleNamespace(**{'level{}'.format(level): data})
+    return data
+
+
+def deep_path(depth):
+    return '.'.join(
+        ['level{}'.format(level) for level in reversed(range(depth))] + ['id']
+    )
+
+
+DEEP_DATA = deep_data(5)
+DEEP_PATH = deep_path(5)
+SHALLOW_DATA = deep_data(0)
+
+
+def context():
+    return SimpleNamespace(user=None)
+
+
+def context_with(permissions):
+    info_context = context()
+    info_context.permissions = permissions
+    return info_context
+
+
+def denied(func, *args, **kwargs):
+    def run():
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            pass
+    return run
+
+
+def benchmarks():
+    group_node = SimpleNamespace(group=SimpleNamespace(id='group-0'))
+    memo_context = context_with(GROUPED_PERMISSIONS)
+
+    @has_field_access('permission1', filter_field='group.id')
+    def resolve_allowed(data, info):
+        return data
+
+    @has_field_access('permission-missing', filter_field='group.id')
+    def resolve_denied(data, info):
+        return data
+
+    info = SimpleNamespace(context=memo_context)
+
+    return {
+        'restructure_permissions.small': lambda: api.restructure_permissions(
+            SMALL
+        ),
+        'restructure_permissions.large': lambda: api.restructure_permissions(
+            LARGE
+        ),
+        'restructure_permissions.grouped':
+            lambda: api.restructure_permissions(GROUPED),
+        '_has_access.small.hit': lambda: api._has_access(
+            'permission1',
+            user_permissions=SMALL_PERMISSIONS,
+        ),
+        '_has_access.small.miss': denied(
+            api._has_access,
+            'permission-missing',
+            user_permissions=SMALL_PERMISSIONS,
+        ),
+        '_has_access.large.hit': lambda: api._has_access(
+            'permission-missing',
+            'permission499',
+            user_permissions=LARGE_PERMISSIONS,
+        ),
+        '_has_access.large.miss': denied(
+            api._has_access,
+            'permission-missing',
+            user_permissions=LARGE_PERMISSIONS,
+        ),
+        '_has_access.grouped.hit': lambda: api._has_access(
+            'permission1',
+            user_permissions=GROUPED_PERMISSIONS,
+            filter_id='group-0',
+        ),
+        '_has_access.grouped.miss': denied(
+            api._has_access,
+            'permission1',
+            user_permissions=GROUPED_PERMISSIONS,
+            filter_id='group-1',
+        ),
+        'get_filter_data.depth1': lambda: api.get_filter_data(
+            SHALLOW_DATA,
+            'id',
+        ),
+        'get_filter_data.depth6': lambda: api.get_filter_data(
+            DEEP_DATA,
+            DEEP_PATH,
+        ),
+        'get_context_permissions': lambda: api.get_context_permissions(
+            memo_context
+        ),
+        'check_field_access.grouped.fresh_context': lambda: (
+            api.check_field_access(
+                'permission1',
+                filter_field='group.id',
+                filter_data=group_node,
+                info_context=context_with(GROUPED_PERMISSIONS),
+            )
+        ),
+        'check_field_access.grouped.memoized': lambda: api.check_field_access(
+            'permission1',
+            filter_field='group.id',
+            filter_data=group_node,
+            info_context=memo_context,
+        ),
+        'check_field_access.grouped.memoized_miss': denied(
+            api.check_field_access,
+            'permission-missing',
+            filter_field='group.id',
+            filter_data=group_node,
+            info_context=memo_context,
+        ),
+        'has_field_access.allowed': lambda: resolve_allowed(group_node, info),
+        'has_field_access.denied': denied(resolve_denied, group_node, info),
+    }
+
+
+def run(names=None, repeat=5):
+    results = []
+    for name, func in benchmarks().items():
+        if names and not any(part in name for part in names):
+            continue
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results.append({
+            'name': name,
+            'ns_per_call': round(best * 1e9, 1),
+            'calls': number,
+            'repeat': repeat,
+        })
+    return results
+
+
+def compare(results, baseline, threshold):
+    baseline = {result['name']: result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['name'])
+        if previous is None:
+            continue
+        ratio = result['ns_per_call'] / previous['ns_per_call']
+        result['baseline_ns_per_call'] = previous['ns_per_call']
+        result['ratio'] = round(ratio, 3)
+        if ratio > threshold:
+            regressions.append(result)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*', help='only run matching names')
+    parser.add_argument('--output', help='write results as a JSON list')
+    parser.add_argument('--compare', help='baseline JSON file from --output')
+    parser.add_argument('--threshold', type=float, default=1.2)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run(args.names, repeat=args.repeat)
+    regressions = []
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file),
+                                  args.threshold)
+
+    for result in results:
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    for result in regressions:
+        print('regression: {name} {ratio}x slower'.format(**result),
+              file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
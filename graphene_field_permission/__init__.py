@@ -1,3 +1,8 @@
-from .api import check_field_access
+from .api import (
+    check_field_access,
+    check_field_access_async,
+    check_field_access_many,
+)
+from .permissions_loader import configure, SettingsProvider
 
 name = "graphene_field_permission"
@@ -1,14 +1,130 @@
+import asyncio
+import inspect
+import itertools
 import logging
-from . import permissions_loader
+import operator
+import time
+from functools import lru_cache
+from . import batching, engine, executors, metrics, permissions_loader
+from .cache import user_key
+from .lazy import LazyGroupPermissions
+from .singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Switch for the debug logging on the permission check path. The branches
+# are also guarded by __debug__ so running under `python -O` compiles them
+# out entirely.
+DEBUG = True
+
+_trace_every = 0
+_trace_counter = itertools.count()
+
+# cross-request cache used by fetch_permissions, see set_permissions_cache
+permissions_cache = None
+
+# filter id hierarchy used by permissions_filter, see set_scope_index
+scope_index = None
+
+# concurrent fetches for the same user share one load, see set_single_flight
+single_flight = SingleFlight()
+
+
+def set_trace_sampling(every):
+    """
+    Log one in every `every` access decisions at INFO level, regardless of
+    DEBUG, for troubleshooting production traffic.
+    :param every: sampling interval, 0 disables tracing
+    """
+    global _trace_every
+    if every < 0:
+        raise ValueError('trace sampling interval must be 0 or more')
+    _trace_every = every
+
+
+def set_permissions_cache(cache):
+    """
+    Install a cross-request permissions cache for fetch_permissions.
+    :param cache: a cache.PermissionCache or any object providing get(user),
+    set(user, permissions), invalidate(user) and invalidate_all().
+    None disables caching.
+    """
+    global permissions_cache
+    permissions_cache = cache
+
+
+def set_scope_index(index):
+    """
+    Install a scopes.ScopeIndex so grants on a filter id also apply to its
+    descendants. None restores exact filter id matching.
+    """
+    global scope_index
+    scope_index = index
+
+
+def set_single_flight(flight):
+    """
+    Install the singleflight.SingleFlight that concurrent fetch_permissions
+    and fetch_permissions_async calls for a user wait on, e.g. to set a
+    timeout. None loads permissions for every caller.
+    """
+    global single_flight
+    single_flight = flight
+
+
+class AccessDenied(PermissionError):
+    """
+    PermissionError raised by _has_access. The message is only formatted
+    when it is rendered. relevant_permissions is None for denials replayed
+    from a shared preauth.PlanCache, which don't carry a user's permissions.
+    """
+    def __init__(self, required_permissions, relevant_permissions=None):
+        super().__init__(required_permissions, relevant_permissions)
+        self.required_permissions = required_permissions
+        self.relevant_permissions = relevant_permissions
+
+    def __str__(self):
+        if self.relevant_permissions is None:
+            return 'no match found on {}'.format(self.required_permissions)
+        return 'no match found on {} against {}'.format(
+            self.required_permissions,
+            self.relevant_permissions,
+        )
+
+
+class FieldsDenied(PermissionError):
+    """
+    Single response level error summarising the fields has_field_access
+    masked in soft deny mode, see get_denial_error.
+    :param denials: dict of field name -> times denied
+    """
+    def __init__(self, denials):
+        super().__init__(denials)
+        self.denials = denials
+
+    @property
+    def count(self):
+        return sum(self.denials.values())
+
+    def __str__(self):
+        return 'No access for user on {} fields: {}'.format(
+            self.count,
+            ', '.join(
+                '{} ({})'.format(field, count)
+                for field, count in sorted(self.denials.items())
+            )
+        )
+
 
 def permissions_filter(user_permissions, filter_id):
-    logger.debug("_permissions_filter: find {} in {}".format(
-        filter_id,
-        user_permissions
-    ))
+    if __debug__ and DEBUG and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "_permissions_filter: find %s in %s",
+            filter_id,
+            user_permissions
+        )
+    if scope_index is not None:
+        return _scoped_permissions(user_permissions, filter_id, scope_index)
     try:
         filtered_perms = user_permissions[filter_id]
     except KeyError:
@@ -18,7 +134,53 @@ def permissions_filter(user_permissions, filter_id):
     return filtered_perms
 
 
-def get_filter_data(data, filter_field):
+def _scoped_permissions(user_permissions, filter_id, index):
+    # union of the grants on the filter id and each of its ancestors
+    found = []
+    for scope_id in index.chain(filter_id):
+        try:
+            found.append(user_permissions[scope_id])
+        except KeyError:
+            pass
+
+    if not found:
+        error_msg = "You don't have any permissions on filter {}"
+        raise ValueError(error_msg.format(filter_id))
+    if len(found) == 1:
+        return found[0]
+    mask = 0
+    for scope_permissions in found:
+        mask |= engine.mask_of(scope_permissions)
+    return engine.PermissionSet(mask=mask)
+
+
+class FilterPath:
+    """
+    A filter_field compiled to an attribute getter chain. Calling it with
+    the filter data returns the filter id.
+    """
+    __slots__ = ('filter_field', '_getter')
+
+    def __init__(self, filter_field):
+        self.filter_field = filter_field
+        self._getter = operator.attrgetter(filter_field)
+
+    def __call__(self, data):
+        try:
+            return str(self._getter(data))
+        except AttributeError:
+            return _traverse_filter_data(data, self.filter_field)
+
+    def __repr__(self):
+        return repr(self.filter_field)
+
+
+@lru_cache(maxsize=None)
+def compile_filter_field(filter_field):
+    return FilterPath(filter_field)
+
+
+def _traverse_filter_data(data, filter_field):
     filter_list = filter_field.split('.')
     # traverse the related data
     while len(filter_list):
@@ -32,6 +194,12 @@ def get_filter_data(data, filter_field):
     return str(data)
 
 
+def get_filter_data(data, filter_field):
+    if not isinstance(filter_field, FilterPath):
+        filter_field = compile_filter_field(filter_field)
+    return filter_field(data)
+
+
 def _has_access(*required_permissions, user_permissions, filter_id=None):
     if filter_id is None:
         relevant_permissions = user_permissions
@@ -41,73 +209,457 @@ def _has_access(*required_permissions, user_permissions, filter_id=None):
             filter_id
         )
 
-    for perm in required_permissions:
-        logger.debug("check user has {} in {}".format(
-            perm,
+    requirement = engine.compile_requirement(*required_permissions)
+    if __debug__ and DEBUG and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "check user has one of %s in %s",
+            requirement,
             relevant_permissions,
-        ))
-        try:
-            match = relevant_permissions[perm.lower()]
-            return match
-        except KeyError:
-            pass
+        )
+    granted = requirement.mask & engine.mask_of(relevant_permissions)
+    if _trace_every and next(_trace_counter) % _trace_every == 0:
+        logger.info(
+            "trace: %s on filter %s %s",
+            requirement,
+            filter_id,
+            'granted' if granted else 'denied',
+        )
+    if granted:
+        return True
 
-    raise PermissionError('no match found on {} against {}'.format(
-        required_permissions,
-        relevant_permissions,
-    ))
+    raise AccessDenied(requirement.permissions, relevant_permissions)
 
 
 def restructure_permissions(raw_permissions):
     if isinstance(raw_permissions, list):
-        return {value: True for value in raw_permissions}
+        return engine.PermissionSet(raw_permissions)
     elif isinstance(raw_permissions, dict):
         permissions = {}
         for group in raw_permissions:
-            group_perms = {value: True for value in raw_permissions[group]}
-            permissions[group] = group_perms
+            permissions[group] = engine.PermissionSet(raw_permissions[group])
         return permissions
+    elif isinstance(raw_permissions, LazyGroupPermissions):
+        # groups are restructured as they're loaded
+        return raw_permissions
+
+
+def _cached_permissions(user):
+    cache = permissions_cache
+    if cache is None:
+        return None
+    permissions = cache.get(user)
+    if metrics.enabled:
+        if permissions is None:
+            metrics.increment('fetch_permissions.cache_misses')
+        else:
+            metrics.increment('fetch_permissions.cache_hits')
+    return permissions
 
 
 def fetch_permissions(user):
+    permissions = _cached_permissions(user)
+    if permissions is not None:
+        return permissions
+
+    flight = single_flight
+    key = user_key(user)
+    if flight is None or key is None:
+        return _load_permissions(user)
+    return flight.do(key, _load_permissions, user)
+
+
+def _load_permissions(user):
+    permissions_func = permissions_loader.get_permissions_method()
+    if metrics.enabled:
+        start = time.perf_counter()
+        permissions_list = permissions_func(user)
+        metrics.observe(
+            'fetch_permissions.loader_seconds',
+            time.perf_counter() - start
+        )
+    else:
+        permissions_list = permissions_func(user)
+    if inspect.isawaitable(permissions_list):
+        if inspect.iscoroutine(permissions_list):
+            permissions_list.close()
+        error_msg = 'Permissions method is async. Use fetch_permissions_async.'
+        raise TypeError(error_msg)
+    return _store_permissions(user, permissions_list)
+
+
+def fetch_permissions_many(users, batch_size=None):
+    """
+    fetch_permissions for many users, e.g. in batch jobs. Users missing from
+    the permissions cache are loaded with the bulk permissions method when
+    one is configured (SRC_BULK_METHOD), one call per batch, and the results
+    are cached. Users the bulk method leaves out, or all of them without a
+    bulk method, are fetched one at a time.
+    :param batch_size: most users passed to one bulk method call, None for
+    all of them at once
+    :return: list of permissions in the same order as users
+    """
+    users = list(users)
+    results = [None] * len(users)
+    # cache key -> positions in users, so duplicates are loaded once
+    missing = {}
+    for position, user in enumerate(users):
+        permissions = _cached_permissions(user)
+        if permissions is not None:
+            results[position] = permissions
+            continue
+        key = user_key(user)
+        if key is None:
+            results[position] = fetch_permissions(user)
+        else:
+            missing.setdefault(key, []).append(position)
+
+    bulk_func = permissions_loader.get_bulk_permissions_method()
+    keys = list(missing)
+    step = batch_size or len(keys) or 1
+    for offset in range(0, len(keys), step):
+        batch = keys[offset:offset + step]
+        loaded = {}
+        if bulk_func is not None:
+            loaded = _load_permissions_many(
+                bulk_func,
+                [users[missing[key][0]] for key in batch]
+            )
+        for key in batch:
+            positions = missing[key]
+            user = users[positions[0]]
+            if key in loaded:
+                permissions = _store_permissions(user, loaded[key])
+            else:
+                permissions = fetch_permissions(user)
+            for position in positions:
+                results[position] = permissions
+    return results
+
+
+def _load_permissions_many(bulk_func, users):
+    if metrics.enabled:
+        start = time.perf_counter()
+        permissions_lists = bulk_func(users)
+        metrics.observe(
+            'fetch_permissions.bulk_loader_seconds',
+            time.perf_counter() - start
+        )
+        metrics.increment('fetch_permissions.bulk_users', len(users))
+    else:
+        permissions_lists = bulk_func(users)
+    if inspect.isawaitable(permissions_lists):
+        if inspect.iscoroutine(permissions_lists):
+            permissions_lists.close()
+        error_msg = 'Bulk permissions method must be synchronous.'
+        raise TypeError(error_msg)
+    return permissions_lists
+
+
+async def fetch_permissions_async(user):
+    """
+    fetch_permissions for async stacks. Async permissions methods are
+    awaited, sync ones are run with executors.run_sync so they don't block
+    the event loop.
+    """
+    permissions = _cached_permissions(user)
+    if permissions is not None:
+        return permissions
+
+    flight = single_flight
+    key = user_key(user)
+    if flight is None or key is None:
+        return await _load_permissions_async(user)
+    return await flight.do_async(key, _load_permissions_async, user)
+
+
+async def _load_permissions_async(user):
     permissions_func = permissions_loader.get_permissions_method()
-    permissions_list = permissions_func(user)
+    start = time.perf_counter() if metrics.enabled else None
+    if inspect.iscoroutinefunction(permissions_func):
+        permissions_list = await permissions_func(user)
+    else:
+        permissions_list = await executors.run_sync(permissions_func, user)
+        if inspect.isawaitable(permissions_list):
+            permissions_list = await permissions_list
+    if start is not None:
+        metrics.observe(
+            'fetch_permissions.loader_seconds',
+            time.perf_counter() - start
+        )
+    return _store_permissions(user, permissions_list)
+
+
+def _store_permissions(user, permissions_list):
     permissions = restructure_permissions(permissions_list)
-    logger.debug("fetch_permissions: {}".format(permissions))
+    if __debug__ and DEBUG and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("fetch_permissions: %s", permissions)
+    cache = permissions_cache
+    if cache is not None:
+        cache.set(user, permissions)
     return permissions
 
 
+def _check_filter_data(filter_data):
+    if filter_data is None:
+        error_msg = 'filter_data empty. Must be set if filter_field is set'
+        raise AttributeError(error_msg)
+
+
+def _get_filter_id(filter_field, filter_data, info_context):
+    if filter_field is None:
+        return None
+    _check_filter_data(filter_data)
+    # filter ids primed in bulk by batching.prime_filter_fields
+    loader = getattr(info_context, 'filter_loader', None)
+    if isinstance(loader, batching.FilterDataLoader):
+        filter_id = loader.get(
+            filter_data,
+            getattr(filter_field, 'filter_field', filter_field)
+        )
+        if filter_id is not None:
+            return filter_id
+    return get_filter_data(filter_data, filter_field)
+
+
+async def _get_filter_id_async(filter_field, filter_data, info_context):
+    if filter_field is None:
+        return None
+    _check_filter_data(filter_data)
+    # batched with the other nodes resolving in this tick
+    loader = batching.get_filter_loader(info_context)
+    return await loader.load(
+        filter_data,
+        getattr(filter_field, 'filter_field', filter_field)
+    )
+
+
+def get_context_permissions(info_context):
+    """
+    Returns the user's permissions for the request, fetching them on first
+    use and keeping them on info_context.
+    """
+    # try/except benchmarks faster than hasattr here as the permissions are
+    # already set for all but the first check of a request
+    try:
+        return info_context.permissions
+    except AttributeError:
+        pass
+
+    user_permissions = fetch_permissions(
+        info_context.user
+    )
+    info_context.permissions = user_permissions
+    info_context.permission_decisions = {}
+    return user_permissions
+
+
 def check_field_access(*required_permissions, filter_field=None,
                        filter_data=None, info_context):
     """
     Confirms user has access to a permission
     :param required_permissions: multiple arguments, one of which is required
     to be listed in user_permissions
-    :param filter_field: field/hierarchy to look up, dot separated
+    :param filter_field: field/hierarchy to look up, dot separated, or a
+    FilterPath from compile_filter_field
     :param filter_data: traversed for value if filter_field is set
     :param info_context the info.context object from graphene
     :raises PermissionException if no permissions assigned
     """
-    filter_id = None
-    if filter_field is not None:
-        if filter_data is None:
-            error_msg = 'filter_data empty. Must be set if filter_field is set'
-            raise AttributeError(error_msg)
-        filter_id = get_filter_data(filter_data, filter_field)
+    if metrics.enabled:
+        start = time.perf_counter()
+        try:
+            return _check_field_access(
+                required_permissions,
+                filter_field,
+                filter_data,
+                info_context
+            )
+        finally:
+            metrics.observe(
+                'check_field_access.seconds',
+                time.perf_counter() - start
+            )
+    return _check_field_access(
+        required_permissions,
+        filter_field,
+        filter_data,
+        info_context
+    )
+
+
+def _check_field_access(required_permissions, filter_field, filter_data,
+                        info_context):
+    filter_id = _get_filter_id(filter_field, filter_data, info_context)
+    user_permissions = get_context_permissions(info_context)
+    return _decide(
+        required_permissions,
+        user_permissions,
+        filter_id,
+        info_context
+    )
+
+
+def check_field_access_many(items, *required_permissions, filter_field=None,
+                            info_context):
+    """
+    check_field_access for every item of a list at once.
+    :param items: the objects filter_field is looked up on
+    :param filter_field: dot separated field/hierarchy, as for
+    check_field_access. The ids are resolved in bulk and each distinct id is
+    decided once.
+    :return list of booleans, True where the user has access to the item.
+    Items are denied rather than raising.
+    """
+    items = list(items)
+    user_permissions = get_context_permissions(info_context)
+    if filter_field is None:
+        allowed = _allowed(
+            required_permissions,
+            user_permissions,
+            None,
+            info_context
+        )
+        return [allowed] * len(items)
+
+    filter_field = getattr(filter_field, 'filter_field', filter_field)
+    loader = batching.get_filter_loader(info_context)
+    loader.prime(items, filter_field)
+    filter_ids = [loader.get(item, filter_field) for item in items]
+    verdicts = {}
+    for filter_id in filter_ids:
+        if filter_id not in verdicts:
+            verdicts[filter_id] = _allowed(
+                required_permissions,
+                user_permissions,
+                filter_id,
+                info_context
+            )
+    if metrics.enabled:
+        metrics.increment('check_field_access_many.items', len(items))
+        metrics.increment('check_field_access_many.filter_ids', len(verdicts))
+    return [verdicts[filter_id] for filter_id in filter_ids]
+
+
+def _allowed(required_permissions, user_permissions, filter_id, info_context):
+    try:
+        _decide(required_permissions, user_permissions, filter_id,
+                info_context)
+    except (PermissionError, ValueError):
+        # ValueError when the user has nothing on the filter id
+        return False
+    return True
+
+
+def get_decisions(info_context):
+    """
+    Request scoped memo of access decisions keyed by
+    (Requirement, filter_id). Values are True or the PermissionError or
+    ValueError raised.
+    """
+    decisions = getattr(info_context, 'permission_decisions', None)
+    if not isinstance(decisions, dict):
+        decisions = info_context.permission_decisions = {}
+    return decisions
+
+
+def record_denial(info_context, field):
+    """
+    Counts a field masked in soft deny mode on the request.
+    """
+    denials = getattr(info_context, 'permission_denials', None)
+    if not isinstance(denials, dict):
+        denials = info_context.permission_denials = {}
+    denials[field] = denials.get(field, 0) + 1
+
+
+def get_denial_error(info_context):
+    """
+    Returns a FieldsDenied for the fields masked in soft deny mode during
+    the request, to add to the response errors once, or None.
+    """
+    denials = getattr(info_context, 'permission_denials', None)
+    if not isinstance(denials, dict) or not denials:
+        return None
+    return FieldsDenied(dict(denials))
+
+
+def _decide(required_permissions, user_permissions, filter_id, info_context):
+    # request scoped memo of decisions, denials included, so repeated
+    # checks across a list of nodes are a single dict lookup
+    requirement = engine.compile_requirement(*required_permissions)
+    key = (requirement, filter_id)
+    decisions = get_decisions(info_context)
+    try:
+        decision = decisions[key]
+        memo_hit = True
+    except KeyError:
+        memo_hit = False
+        try:
+            decision = _has_access(
+                requirement,
+                user_permissions=user_permissions,
+                filter_id=filter_id
+            )
+        except (PermissionError, ValueError) as exc:
+            # ValueError when the user has nothing on the filter id
+            decision = exc
+        decisions[key] = decision
+
+    denied = isinstance(decision, Exception)
+    if metrics.enabled:
+        metrics.increment('check_field_access.checks')
+        if memo_hit:
+            metrics.increment('check_field_access.memo_hits')
+        if denied:
+            metrics.increment('check_field_access.denied')
+    if denied:
+        raise decision.with_traceback(None)
+    return decision
+
 
-    # caching
-    # TODO: run some benchmarks on this to see if better to
-    # have it be try/except based
+async def get_context_permissions_async(info_context):
+    """
+    get_context_permissions for async resolvers, fetching the permissions
+    without blocking the event loop.
+    """
     if hasattr(info_context, 'permissions'):
-        user_permissions = info_context.permissions
-    else:
-        user_permissions = fetch_permissions(
-            info_context.user
+        return info_context.permissions
+
+    # concurrent resolvers in the request share a single fetch
+    future = getattr(info_context, 'permissions_future', None)
+    if future is None:
+        future = asyncio.ensure_future(
+            fetch_permissions_async(info_context.user)
         )
-        info_context.permissions = user_permissions
+        info_context.permissions_future = future
+    try:
+        # shielded so a cancelled resolver doesn't cancel the shared fetch
+        user_permissions = await asyncio.shield(future)
+    except Exception:
+        if getattr(info_context, 'permissions_future', None) is future:
+            # let the next check retry
+            info_context.permissions_future = None
+        raise
+    info_context.permissions = user_permissions
+    info_context.permission_decisions = {}
+    return user_permissions
 
-    return _has_access(
-        *required_permissions,
-        user_permissions=user_permissions,
-        filter_id=filter_id
+
+async def check_field_access_async(*required_permissions, filter_field=None,
+                                   filter_data=None, info_context):
+    """
+    check_field_access for async resolvers and permissions methods
+    :raises PermissionException if no permissions assigned
+    """
+    filter_id = await _get_filter_id_async(
+        filter_field,
+        filter_data,
+        info_context
+    )
+    user_permissions = await get_context_permissions_async(info_context)
+    return _decide(
+        required_permissions,
+        user_permissions,
+        filter_id,
+        info_context
     )
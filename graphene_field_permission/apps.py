@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from . import permissions_loader
+
+
+class GrapheneFieldPermissionConfig(AppConfig):
+    name = 'graphene_field_permission'
+
+    def ready(self):
+        # resolve and validate the permissions method once at startup,
+        # unless it was already configured programmatically
+        if not permissions_loader.is_configured():
+            permissions_loader.configure()
@@ -0,0 +1,345 @@
+import hashlib
+import os
+import stat
+import struct
+import tempfile
+import threading
+import time
+from . import serialization
+from .cache import LRUCache, user_key
+
+
+class CacheBackend:
+    """
+    Interface for byte stores shared by SharedPermissionCache.
+    """
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+
+class LocalBackend(CacheBackend):
+    """
+    In-process backend, shared by the threads of one worker only.
+    """
+    def __init__(self, max_entries=10000, max_bytes=None,
+                 clock=time.monotonic):
+        self.clock = clock
+        self.entries = LRUCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            sizeof=lambda entry: len(entry[1]),
+        )
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires <= self.clock():
+            self.entries.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else self.clock() + ttl
+        self.entries.set(key, (expires, value))
+
+    def delete(self, key):
+        self.entries.delete(key)
+
+
+class DjangoCacheBackend(CacheBackend):
+    """
+    Backend using one of Django's configured caches, e.g. memcached or
+    redis, shared by every worker using it.
+    """
+    def __init__(self, alias='default'):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.cache.set(key, value, timeout=ttl)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+
+class ClientBackend(CacheBackend):
+    """
+    Backend for memcached/redis style clients providing get, set and delete.
+    :param ttl_argument: name of the client's set() expiry argument, e.g.
+    'ex' for redis-py or 'expire' for pymemcache
+    """
+    def __init__(self, client, ttl_argument='ex'):
+        self.client = client
+        self.ttl_argument = ttl_argument
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            self.client.set(key, value)
+        else:
+            self.client.set(key, value, **{self.ttl_argument: int(ttl)})
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+class MemoryClient:
+    """
+    In-process stand-in for a memcached/redis client, for tests and local
+    development. Use with ClientBackend.
+    """
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= self.clock():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        expires = None if ex is None else self.clock() + ex
+        with self._lock:
+            self.data[key] = (value, expires)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self.data.pop(key, None) is not None
+
+
+def _default_directory():
+    # /dev/shm is memory backed on linux, so the files never touch disk
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    name = 'graphene_field_permission'
+    if hasattr(os, 'getuid'):
+        name = '{}-{}'.format(name, os.getuid())
+    return os.path.join(base, name)
+
+
+def _check_directory(directory):
+    # the files are trusted as permissions, so the directory mustn't be one
+    # another local user created or can write to
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        error_msg = 'FileBackend directory {} is not a directory'
+        raise PermissionError(error_msg.format(directory))
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        error_msg = 'FileBackend directory {} is owned by another user'
+        raise PermissionError(error_msg.format(directory))
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        error_msg = 'FileBackend directory {} is group or world writable'
+        raise PermissionError(error_msg.format(directory))
+
+
+class FileBackend(CacheBackend):
+    """
+    Backend keeping one file per key in a directory shared by the workers
+    on a host. Writes are atomic renames. Expired files are swept at most
+    every sweep_interval seconds on write, as keys that are never read
+    again, e.g. after SharedPermissionCache.invalidate_all(), would
+    otherwise stay in memory backed /dev/shm.
+
+    The directory is created readable by its owner only, and refused when
+    it's a symlink, owned by another user or group/world writable, as its
+    files are loaded as permissions.
+    """
+    # expiry (0 for never) and key length, followed by the key and value
+    _header = struct.Struct('<dH')
+    sweep_interval = 60
+
+    def __init__(self, directory=None, clock=time.time):
+        self.directory = directory or _default_directory()
+        self.clock = clock
+        self._next_sweep = clock() + self.sweep_interval
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        _check_directory(self.directory)
+
+    def _path(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def _read(self, path):
+        """
+        Returns the (expires, key, value) stored at path, or None.
+        """
+        try:
+            with open(path, 'rb') as cache_file:
+                data = cache_file.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < self._header.size:
+            return None
+        expires, key_length = self._header.unpack_from(data)
+        offset = self._header.size + key_length
+        key = data[self._header.size:offset].decode('utf-8', 'replace')
+        return expires, key, data[offset:]
+
+    def get(self, key):
+        entry = self._read(self._path(key))
+        if entry is None:
+            return None
+        expires, _, value = entry
+        if expires and expires <= self.clock():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        now = self.clock()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self.sweep()
+        expires = 0 if ttl is None else now + ttl
+        encoded_key = key.encode('utf-8')
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=self.directory,
+            prefix='.tmp'
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as cache_file:
+                cache_file.write(self._header.pack(expires, len(encoded_key)))
+                cache_file.write(encoded_key)
+                cache_file.write(value)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, stale=None):
+        """
+        Deletes expired files, and those whose key stale(key) is true for.
+        Returns how many were deleted.
+        """
+        now = self.clock()
+        deleted = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.tmp') or not entry.is_file():
+                    continue
+                stored = self._read(entry.path)
+                if stored is None:
+                    continue
+                expires, key, _ = stored
+                if (expires and expires <= now) or \
+                        (stale is not None and stale(key)):
+                    try:
+                        os.unlink(entry.path)
+                        deleted += 1
+                    except FileNotFoundError:
+                        pass
+        return deleted
+
+
+class SharedPermissionCache:
+    """
+    Permissions cache over a CacheBackend shared between workers, installed
+    with api.set_permissions_cache(). Permissions are stored in the
+    serialization format, and keys carry a generation number kept in
+    the backend, so invalidate_all() makes every worker miss.
+
+    The generation is read from the backend at most every generation_ttl
+    seconds rather than on every call, so other workers see an
+    invalidate_all() within that time.
+    """
+    def __init__(self, backend, ttl=300, prefix='gfp', key=user_key,
+                 dumps=serialization.dumps,
+                 loads=serialization.loads,
+                 generation_ttl=1.0, clock=time.monotonic):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.key = key
+        self.dumps = dumps
+        self.loads = loads
+        self.generation_ttl = generation_ttl
+        self.clock = clock
+        self._generation_key = '{}:generation'.format(prefix)
+        # (generation, read at)
+        self._cached_generation = None
+
+    def _generation(self):
+        cached = self._cached_generation
+        now = self.clock()
+        if cached is not None and now - cached[1] < self.generation_ttl:
+            return cached[0]
+        generation = self.backend.get(self._generation_key)
+        generation = '0' if generation is None else generation.decode('ascii')
+        self._cached_generation = (generation, now)
+        return generation
+
+    def _key(self, user):
+        key = self.key(user)
+        if key is None:
+            return None
+        return '{}:{}:{}'.format(self.prefix, self._generation(), key)
+
+    def get(self, user):
+        key = self._key(user)
+        if key is None:
+            return None
+        data = self.backend.get(key)
+        if data is None:
+            return None
+        try:
+            return self.loads(data)
+        except ValueError:
+            # e.g. written by a worker using another format version
+            return None
+
+    def set(self, user, permissions):
+        key = self._key(user)
+        if key is None or permissions is None:
+            return
+        data = self.dumps(permissions)
+        if data is not None:
+            self.backend.set(key, data, self.ttl)
+
+    def invalidate(self, user):
+        key = self._key(user)
+        if key is not None:
+            self.backend.delete(key)
+
+    def invalidate_all(self):
+        # read fresh, another worker may have bumped it within generation_ttl
+        self._cached_generation = None
+        generation = str(int(self._generation()) + 1)
+        self.backend.set(self._generation_key, generation.encode('ascii'))
+        self._cached_generation = (generation, self.clock())
+
+        sweep = getattr(self.backend, 'sweep', None)
+        if sweep is not None:
+            # backends without expiry of their own, old entries are never
+            # read again
+            current = '{}:{}:'.format(self.prefix, generation)
+            prefix = '{}:'.format(self.prefix)
+            sweep(stale=lambda key: key.startswith(prefix) and
+                  key != self._generation_key and
+                  not key.startswith(current))
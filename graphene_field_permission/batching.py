@@ -0,0 +1,133 @@
+import asyncio
+from . import api, executors
+
+
+def _prefetch(objects, lookup):
+    try:
+        from django.db.models import prefetch_related_objects
+    except ImportError:
+        return
+    if not hasattr(objects[0], '_meta'):
+        return
+    try:
+        prefetch_related_objects(objects, lookup)
+    except (AttributeError, ValueError):
+        # not a chain of relations, fall back to lazy traversal
+        pass
+
+
+def resolve_filter_ids(objects, filter_field):
+    """
+    Resolves filter_field for many objects at once. Django model instances
+    have the related objects on the path prefetched first, one query per
+    hop keyed by primary key, so the traversal doesn't query per object.
+    """
+    objects = list(objects)
+    filter_list = filter_field.split('.')
+    if objects and len(filter_list) > 1:
+        _prefetch(objects, '__'.join(filter_list[:-1]))
+    filter_path = api.compile_filter_field(filter_field)
+    return [filter_path(obj) for obj in objects]
+
+
+class FilterDataLoader:
+    """
+    Request scoped, DataLoader style cache of filter ids. Objects passed to
+    prime() are resolved in bulk immediately, load() batches the objects
+    requested within an event loop tick.
+    """
+    def __init__(self, resolve_many=resolve_filter_ids):
+        self.resolve_many = resolve_many
+        # (id(obj), filter_field) -> (obj, filter_id), obj is kept so its
+        # id isn't reused during the request
+        self._resolved = {}
+        self._pending = {}
+        self._tasks = set()
+
+    def get(self, obj, filter_field):
+        entry = self._resolved.get((id(obj), filter_field))
+        return None if entry is None else entry[1]
+
+    def prime(self, objects, filter_field):
+        objects = [
+            obj for obj in objects
+            if (id(obj), filter_field) not in self._resolved
+        ]
+        if objects:
+            self._store(objects, filter_field)
+        return objects
+
+    def load(self, obj, filter_field):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        filter_id = self.get(obj, filter_field)
+        if filter_id is not None:
+            future.set_result(filter_id)
+            return future
+
+        if not self._pending:
+            loop.call_soon(self._dispatch, loop)
+        self._pending.setdefault(filter_field, []).append((obj, future))
+        return future
+
+    def _store(self, objects, filter_field):
+        filter_ids = self.resolve_many(objects, filter_field)
+        self._remember(objects, filter_field, filter_ids)
+        return filter_ids
+
+    def _remember(self, objects, filter_field, filter_ids):
+        for obj, filter_id in zip(objects, filter_ids):
+            self._resolved[(id(obj), filter_field)] = (obj, filter_id)
+
+    def _dispatch(self, loop):
+        pending, self._pending = self._pending, {}
+        for filter_field, requests in pending.items():
+            task = loop.create_task(self._resolve(filter_field, requests))
+            # keep a reference until it's done
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, filter_field, requests):
+        objects = {id(obj): obj for obj, future in requests}
+        objects = [
+            obj for obj in objects.values()
+            if (id(obj), filter_field) not in self._resolved
+        ]
+        try:
+            if objects:
+                # prefetching and lazy relation loads are blocking ORM
+                # queries, which Django refuses to run on the event loop
+                filter_ids = await executors.run_sync(
+                    self.resolve_many,
+                    objects,
+                    filter_field
+                )
+                self._remember(objects, filter_field, filter_ids)
+        except Exception as exc:
+            for obj, future in requests:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for obj, future in requests:
+            if not future.done():
+                future.set_result(self.get(obj, filter_field))
+
+
+def get_filter_loader(info_context):
+    loader = getattr(info_context, 'filter_loader', None)
+    if not isinstance(loader, FilterDataLoader):
+        loader = info_context.filter_loader = FilterDataLoader()
+    return loader
+
+
+def prime_filter_fields(info_context, objects, *filter_fields):
+    """
+    Resolves the filter ids of a list resolver's results in bulk so the
+    has_field_access checks on each node don't traverse them one by one.
+    Returns the objects so it can wrap the resolver's return value.
+    """
+    objects = list(objects)
+    loader = get_filter_loader(info_context)
+    for filter_field in filter_fields:
+        loader.prime(objects, filter_field)
+    return objects
@@ -0,0 +1,132 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+def user_key(user):
+    """
+    Identity used to key cached permissions. Returns None for users that
+    shouldn't be cached, e.g. anonymous users without an id.
+    """
+    key = getattr(user, 'pk', None)
+    if key is None:
+        key = getattr(user, 'id', None)
+    return key
+
+
+def estimate_size(value):
+    size = sys.getsizeof(value)
+    mask = getattr(value, 'mask', None)
+    if mask is not None:
+        return size + sys.getsizeof(mask)
+    if isinstance(value, Mapping):
+        for key in value:
+            size += estimate_size(key) + estimate_size(value[key])
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with an optional TTL, entry count limit and byte
+    budget. Sizes are estimated with `sizeof` when a value is stored.
+    """
+    def __init__(self, ttl=None, max_entries=None, max_bytes=None,
+                 sizeof=estimate_size, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.clock = clock
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires, size = self._entries[key]
+            except KeyError:
+                return default
+            if expires is not None and expires <= self.clock():
+                del self._entries[key]
+                self.bytes -= size
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.delete(key)
+            return
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            self._entries[key] = (value, expires, size)
+            self.bytes += size
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _evict(self):
+        entries = self._entries
+        if self.max_entries is not None:
+            while len(entries) > self.max_entries:
+                self.bytes -= entries.popitem(last=False)[1][2]
+        if self.max_bytes is not None:
+            while self.bytes > self.max_bytes:
+                self.bytes -= entries.popitem(last=False)[1][2]
+
+
+class PermissionCache:
+    """
+    Cross-request cache of restructured permissions keyed by user identity.
+    Install it with api.set_permissions_cache().
+    """
+    def __init__(self, ttl=300, max_entries=10000, max_bytes=None,
+                 key=user_key, **kwargs):
+        self.key = key
+        self.entries = LRUCache(
+            ttl=ttl,
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            **kwargs
+        )
+
+    def get(self, user):
+        key = self.key(user)
+        if key is None:
+            return None
+        return self.entries.get(key)
+
+    def set(self, user, permissions):
+        key = self.key(user)
+        if key is not None and permissions is not None:
+            self.entries.set(key, permissions)
+
+    def invalidate(self, user):
+        key = self.key(user)
+        if key is not None:
+            self.entries.delete(key)
+
+    def invalidate_all(self):
+        self.entries.clear()
@@ -1,29 +1,229 @@
+import inspect
 import logging
+import time
 from functools import wraps
-from . import api
+from . import api, engine, executors, metrics, registry
 
 logger = logging.getLogger(__name__)
 
 
+def _record(tags, start, denied=False):
+    metrics.observe(
+        'field_access.seconds',
+        time.perf_counter() - start,
+        tags
+    )
+    metrics.increment('field_access.checks', tags=tags)
+    if denied:
+        metrics.increment('field_access.denied', tags=tags)
+
+
+_unset = object()
+
+
 class has_field_access:
-    def __init__(self, *req_perms, filter_field=None):
+    # Soft deny: denied fields resolve to masked_value, e.g. None for
+    # nullable fields or a sentinel, instead of raising an error per node.
+    # Denials are counted on the request for api.get_denial_error. Set on
+    # the class to change the default for every field.
+    soft_deny = False
+    masked_value = None
+
+    def __init__(self, *req_perms, filter_field=None, soft_deny=None,
+                 masked_value=_unset):
+        if soft_deny is not None:
+            self.soft_deny = soft_deny
+        if masked_value is not _unset:
+            self.masked_value = masked_value
         self.filter_field = filter_field
         self.req_perms = req_perms
+        # compiled once at schema import rather than on every resolve
+        self.requirement = engine.compile_requirement(*req_perms)
+        if filter_field is None:
+            self.filter_path = None
+        else:
+            self.filter_path = api.compile_filter_field(filter_field)
 
     def __call__(self, func, *args, **kwargs):
+        requirement = self.requirement
+        filter_path = self.filter_path
+        field = registry.field_name_of(func)
+        # only the message is prebuilt, each denial raises its own error so
+        # requests don't share exception state
+        denied_msg = "No access for user on field '{}'".format(field)
+        tags = {'field': func.__qualname__}
+        type_name = registry.type_name_of(func)
+        if type_name is not None:
+            registry.register(type_name, field, self)
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def check_async(data, info, *args, **kwargs):
+                start = time.perf_counter() if metrics.enabled else None
+                try:
+                    await api.check_field_access_async(
+                        requirement,
+                        info_context=info.context,
+                        filter_field=filter_path,
+                        filter_data=data
+                    )
+                except (PermissionError, ValueError) as exc:
+                    # ValueError when the user has nothing on the filter id
+                    if start is not None:
+                        _record(tags, start, denied=True)
+                    if self.soft_deny:
+                        api.record_denial(info.context, field)
+                        return self.masked_value
+                    if isinstance(exc, ValueError):
+                        raise
+                    raise Exception(denied_msg) from None
+                if start is not None:
+                    _record(tags, start)
+
+                return await func(data, info=info, *args, **kwargs)
+            check_async.field_access = self
+            return check_async
+
         @wraps(func)
         def check(data, info, *args, **kwargs):
+            start = time.perf_counter() if metrics.enabled else None
             try:
                 api.check_field_access(
-                    *self.req_perms,
+                    requirement,
                     info_context=info.context,
-                    filter_field=self.filter_field,
+                    filter_field=filter_path,
                     filter_data=data
                 )
-            except PermissionError:
-                field = '_'.join(func.__name__.split('_')[1:])
-                error_msg = "No access for user on field '{}'"
-                raise Exception(error_msg.format(field))
+            except (PermissionError, ValueError) as exc:
+                # ValueError when the user has nothing on the filter id
+                if start is not None:
+                    _record(tags, start, denied=True)
+                if self.soft_deny:
+                    api.record_denial(info.context, field)
+                    return self.masked_value
+                if isinstance(exc, ValueError):
+                    raise
+                raise Exception(denied_msg) from None
+            if start is not None:
+                _record(tags, start)
 
             return func(data, info=info, *args, **kwargs)
+        # lets schema walkers find the requirement, see preauth
+        check.field_access = self
         return check
+
+
+class has_list_access:
+    """
+    Decorates list and connection resolvers, checking the rows they return
+    in one pass with api.check_field_access_many instead of one check per
+    node. Denied rows are dropped, or replaced with masked_value when mask
+    is set. filter_field is looked up on each row.
+
+    Resolved connections have their edges checked. Querysets are evaluated
+    like any other rows, so Django connection fields should use
+    ListAccessConnectionMixin, which checks the page after pagination.
+    """
+    def __init__(self, *req_perms, filter_field=None, mask=False,
+                 masked_value=None):
+        self.filter_field = filter_field
+        self.req_perms = req_perms
+        self.requirement = engine.compile_requirement(*req_perms)
+        self.mask = mask
+        self.masked_value = masked_value
+
+    def _check(self, rows, info_context):
+        return api.check_field_access_many(
+            rows,
+            self.requirement,
+            filter_field=self.filter_field,
+            info_context=info_context
+        )
+
+    def _apply_edges(self, connection, info_context):
+        edges = list(connection.edges)
+        allowed = self._check([edge.node for edge in edges], info_context)
+        if self.mask:
+            for edge, edge_allowed in zip(edges, allowed):
+                if not edge_allowed:
+                    edge.node = self.masked_value
+        else:
+            edges = [
+                edge for edge, edge_allowed in zip(edges, allowed)
+                if edge_allowed
+            ]
+        connection.edges = edges
+        return connection
+
+    def _apply(self, rows, info_context):
+        if hasattr(rows, 'edges'):
+            return self._apply_edges(rows, info_context)
+
+        rows = list(rows)
+        allowed = self._check(rows, info_context)
+        if self.mask:
+            masked_value = self.masked_value
+            return [
+                row if row_allowed else masked_value
+                for row, row_allowed in zip(rows, allowed)
+            ]
+        return [
+            row for row, row_allowed in zip(rows, allowed) if row_allowed
+        ]
+
+    async def _apply_async(self, rows, info_context):
+        # fetched without blocking the loop
+        await api.get_context_permissions_async(info_context)
+        # evaluating querysets and resolving filter ids are ORM queries
+        return await executors.run_sync(self._apply, rows, info_context)
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def check_rows_async(data, info, *args, **kwargs):
+                rows = await func(data, info=info, *args, **kwargs)
+                return await self._apply_async(rows, info.context)
+            check_rows_async.list_access = self
+            return check_rows_async
+
+        @wraps(func)
+        def check_rows(data, info, *args, **kwargs):
+            rows = func(data, info=info, *args, **kwargs)
+            return self._apply(rows, info.context)
+        check_rows.list_access = self
+        return check_rows
+
+
+class ListAccessConnectionMixin:
+    """
+    Mixin for graphene-django DjangoConnectionFields whose resolvers are
+    decorated with has_list_access. The resolver's queryset is paginated
+    first and only the page's edges are checked, instead of the decorator
+    evaluating the whole queryset:
+
+        class CheckedConnectionField(ListAccessConnectionMixin,
+                                     DjangoConnectionField):
+            pass
+    """
+    def wrap_resolve(self, parent_resolver):
+        list_access = getattr(parent_resolver, 'list_access', None)
+        if list_access is None:
+            return super().wrap_resolve(parent_resolver)
+        # paginate what the undecorated resolver returns
+        resolve = super().wrap_resolve(parent_resolver.__wrapped__)
+
+        def check_page(root, info, **args):
+            connection = resolve(root, info, **args)
+            if inspect.isawaitable(connection):
+                return self._check_page_async(
+                    list_access,
+                    connection,
+                    info.context
+                )
+            return list_access._apply(connection, info.context)
+        return check_page
+
+    @staticmethod
+    async def _check_page_async(list_access, connection, info_context):
+        connection = await connection
+        return await list_access._apply_async(connection, info_context)
@@ -0,0 +1,174 @@
+import logging
+import queue
+import threading
+from collections import namedtuple
+from types import SimpleNamespace
+from . import api, engine, metrics, versions
+from .cache import user_key
+from .lazy import LazyGroupPermissions
+
+logger = logging.getLogger(__name__)
+
+PermissionDelta = namedtuple(
+    'PermissionDelta',
+    ['user', 'grant', 'revoke', 'group']
+)
+
+# serialises read-modify-write of cached permissions between deltas
+_lock = threading.Lock()
+
+
+def as_user(user):
+    """
+    Deltas may name users by primary key, e.g. when they come from a
+    message queue. Wraps bare keys so cache.user_key finds them.
+    """
+    if user_key(user) is None and isinstance(user, (int, str)):
+        return SimpleNamespace(pk=user)
+    return user
+
+
+def _apply_mask(permission_set, grant_mask, revoke_mask):
+    return (engine.mask_of(permission_set) | grant_mask) & ~revoke_mask
+
+
+def apply_permissions_delta(permissions, grant=(), revoke=(), group=None):
+    """
+    Returns restructured permissions with the grants added and the revokes
+    removed, leaving the originals untouched as other requests may hold
+    them. Revokes win over grants of the same permission.
+    :param group: the group to change in grouped permissions, None for
+    every group. Groups left without permissions are removed.
+    :return None for permissions that can't be updated in place, e.g.
+    lazy.LazyGroupPermissions, which have to be reloaded
+    """
+    grant_mask = engine.compile_mask(grant)
+    revoke_mask = engine.compile_mask(revoke)
+    if isinstance(permissions, engine.PermissionSet):
+        if group is not None:
+            error_msg = 'Permissions aren\'t grouped, can\'t change group {}'
+            raise ValueError(error_msg.format(group))
+        return engine.PermissionSet(
+            mask=_apply_mask(permissions, grant_mask, revoke_mask)
+        )
+    if isinstance(permissions, LazyGroupPermissions) or \
+            not isinstance(permissions, dict):
+        return None
+
+    updated = dict(permissions)
+    groups = list(updated) if group is None else [group]
+    for group_id in groups:
+        mask = _apply_mask(
+            updated.get(group_id, engine.PermissionSet()),
+            grant_mask,
+            revoke_mask
+        )
+        if mask:
+            updated[group_id] = engine.PermissionSet(mask=mask)
+        else:
+            updated.pop(group_id, None)
+    return updated
+
+
+def apply_delta(user, grant=(), revoke=(), group=None):
+    """
+    Applies a grant/revoke delta to the user's permissions in the api
+    permissions cache, if they're cached, and bumps the user's version so
+    version checked caches such as PermissionsMiddleware pick up the change
+    without calling the permissions method. The change to the permissions
+    themselves must already be saved where the permissions method reads
+    them. Users that aren't cached are simply invalidated.
+    :param user: the user or their primary key
+    :return the updated permissions, or None when they'll be reloaded
+    """
+    user = as_user(user)
+    cache = api.permissions_cache
+    with _lock:
+        cached = None if cache is None else cache.get(user)
+        updated = None
+        if cached is not None:
+            updated = apply_permissions_delta(cached, grant, revoke, group)
+        # invalidates the cached entry, replaced below while still locked
+        versions.bump_version(user)
+        if updated is not None:
+            cache.set(user, updated)
+
+    if metrics.enabled:
+        if updated is None:
+            metrics.increment('deltas.invalidated')
+        else:
+            metrics.increment('deltas.applied')
+    return updated
+
+
+class DeltaQueue:
+    """
+    Local queue of PermissionDeltas, e.g. fed by a message consumer or the
+    admin views, applied by drain() or a background thread from start().
+    """
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def put(self, user, grant=(), revoke=(), group=None):
+        self._queue.put(
+            PermissionDelta(user, tuple(grant), tuple(revoke), group)
+        )
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def drain(self):
+        """
+        Applies the queued deltas in order and returns how many.
+        """
+        applied = 0
+        while True:
+            try:
+                delta = self._queue.get_nowait()
+            except queue.Empty:
+                return applied
+            self._apply(delta)
+            applied += 1
+
+    def _apply(self, delta):
+        try:
+            apply_delta(delta.user, delta.grant, delta.revoke, delta.group)
+        except Exception as e:
+            # a bad delta mustn't stop the rest, reload the user instead
+            logger.error(e)
+            versions.bump_version(as_user(delta.user))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='permission-deltas',
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the background thread once the queued deltas are applied.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        self._queue.put(None)
+        thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            delta = self._queue.get()
+            if delta is None:
+                if self._stopping.is_set():
+                    self.drain()
+                    return
+                continue
+            self._apply(delta)
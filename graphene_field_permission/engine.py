@@ -0,0 +1,151 @@
+import threading
+from collections.abc import Mapping
+from functools import lru_cache
+
+# permission name -> bit position. Ids are never reassigned so compiled
+# masks stay valid for the life of the process.
+_ids = {}
+_names = []
+_lock = threading.Lock()
+
+
+def intern(name):
+    try:
+        return _ids[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _ids:
+            _ids[name] = len(_names)
+            _names.append(name)
+        return _ids[name]
+
+
+def compile_mask(names):
+    mask = 0
+    for name in names:
+        mask |= 1 << intern(name)
+    return mask
+
+
+def lookup_mask(names):
+    """
+    Mask of the names without interning them. Names that were never interned
+    can't be in a compiled Requirement, so they're left out, which keeps
+    e.g. group ids out of the bit table.
+    """
+    mask = 0
+    for name in names:
+        bit = _ids.get(name)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def iter_names(mask):
+    index = 0
+    while mask:
+        if mask & 1:
+            yield _names[index]
+        mask >>= 1
+        index += 1
+
+
+class PermissionSet(Mapping):
+    """
+    Immutable set of permission names stored as a single integer bitmask.
+    Behaves like the {name: True} dicts previously built by
+    restructure_permissions.
+    """
+    __slots__ = ('mask',)
+
+    def __init__(self, names=(), mask=None):
+        self.mask = compile_mask(names) if mask is None else mask
+
+    def __getitem__(self, name):
+        bit = _ids.get(name)
+        if bit is None or not self.mask >> bit & 1:
+            raise KeyError(name)
+        return True
+
+    def __contains__(self, name):
+        bit = _ids.get(name)
+        return bit is not None and bool(self.mask >> bit & 1)
+
+    def __iter__(self):
+        return iter_names(self.mask)
+
+    def __len__(self):
+        return bin(self.mask).count('1')
+
+    def __eq__(self, other):
+        if isinstance(other, PermissionSet):
+            return self.mask == other.mask
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class Requirement:
+    """
+    A has_field_access/check_field_access permission list compiled to a mask.
+    Any one of the permissions grants access.
+    """
+    __slots__ = ('permissions', 'mask')
+
+    def __init__(self, permissions):
+        self.permissions = tuple(perm.lower() for perm in permissions)
+        self.mask = compile_mask(self.permissions)
+
+    def __eq__(self, other):
+        if isinstance(other, Requirement):
+            return self.permissions == other.permissions
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.permissions)
+
+    def __repr__(self):
+        return repr(self.permissions)
+
+
+def compile_requirement(*permissions):
+    if len(permissions) == 1 and isinstance(permissions[0], Requirement):
+        return permissions[0]
+    return _compile_requirement(permissions)
+
+
+@lru_cache(maxsize=1024)
+def _compile_requirement(permissions):
+    return Requirement(permissions)
+
+
+def mask_of(permissions):
+    try:
+        return permissions.mask
+    except AttributeError:
+        pass
+    # plain dicts handed in directly rather than via fetch_permissions
+    if type(permissions) is dict and len(permissions) > len(_ids):
+        # e.g. grouped permissions keyed by thousands of group ids: probe
+        # the interned names instead of walking every key
+        mask = 0
+        for name, bit in list(_ids.items()):
+            if name in permissions:
+                mask |= 1 << bit
+        return mask
+    return lookup_mask(permissions)
+
+
+def fingerprint(permissions):
+    """
+    Hashable key identifying everything checks without a filter_id depend
+    on, so users with equal fingerprints get the same decisions. Costs at
+    most one probe per interned permission name, however many groups
+    grouped permissions have.
+    """
+    return mask_of(permissions)
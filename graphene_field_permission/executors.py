@@ -0,0 +1,24 @@
+import asyncio
+
+
+def _sync_to_async():
+    try:
+        from asgiref.sync import sync_to_async
+    except ImportError:
+        return None
+    return sync_to_async
+
+
+async def run_sync(func, *args):
+    """
+    Runs a blocking call, e.g. ORM queries, from async code without blocking
+    the event loop. With asgiref, as installed with Django, it's run by
+    sync_to_async(thread_sensitive=True) on the thread Django runs sync
+    code on, so its database connections are closed with the request's.
+    Otherwise it's run in the default executor.
+    """
+    sync_to_async = _sync_to_async()
+    if sync_to_async is not None:
+        return await sync_to_async(func, thread_sensitive=True)(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
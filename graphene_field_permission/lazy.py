@@ -0,0 +1,70 @@
+import threading
+from collections.abc import Mapping
+from . import engine
+from .cache import user_key
+
+
+class LazyGroupPermissions(Mapping):
+    """
+    Grouped permissions loaded one group at a time, as filter_field checks
+    ask for them, instead of all up front. Return one from the permissions
+    method in place of the {group: [permissions]} dict:
+
+        def get_user_permissions(user):
+            return LazyGroupPermissions(user, load_group)
+
+    load_group(user, group_id) returns the user's permission list for the
+    group, or None/empty when they have none there. Loaded groups are kept
+    on the instance, which lasts for the request or as long as a permissions
+    cache keeps it, and optionally in a shared `cache` such as a
+    cache.LRUCache keyed by (user, group_id).
+
+    Iterating only covers the groups loaded so far.
+    """
+    def __init__(self, user, load_group, cache=None):
+        self.user = user
+        self.load_group = load_group
+        self.cache = cache
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def _load(self, group_id):
+        cache_key = None
+        if self.cache is not None:
+            key = user_key(self.user)
+            if key is not None:
+                cache_key = (key, group_id)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+        permissions = self.load_group(self.user, group_id)
+        # False marks groups the user has no permissions in
+        group = engine.PermissionSet(permissions) if permissions else False
+        if cache_key is not None:
+            self.cache.set(cache_key, group)
+        return group
+
+    def __getitem__(self, group_id):
+        try:
+            group = self._groups[group_id]
+        except KeyError:
+            with self._lock:
+                group = self._groups.get(group_id)
+                if group is None:
+                    group = self._groups[group_id] = self._load(group_id)
+        if group is False:
+            raise KeyError(group_id)
+        return group
+
+    def __iter__(self):
+        return (
+            group_id for group_id, group in list(self._groups.items())
+            if group is not False
+        )
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(self))
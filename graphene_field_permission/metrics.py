@@ -0,0 +1,118 @@
+import bisect
+import threading
+
+# Instrumented code checks `enabled` before timing or recording anything, so
+# the default no-op sink costs a single global lookup per call.
+enabled = False
+
+
+class MetricsSink:
+    """
+    Interface for metrics sinks. The base class discards everything, subclass
+    it to forward metrics elsewhere, e.g. to statsd or prometheus. Only the
+    base class itself is treated as disabled by set_sink.
+    """
+
+    def increment(self, name, value=1, tags=None):
+        pass
+
+    def observe(self, name, seconds, tags=None):
+        pass
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': dict(zip(self.buckets + ('+Inf',), self.counts)),
+        }
+
+
+class InMemorySink(MetricsSink):
+    """
+    Keeps counters and latency histograms in process, see snapshot().
+    """
+    buckets = (
+        0.00001, 0.00005, 0.0001, 0.0005, 0.001,
+        0.005, 0.01, 0.05, 0.1, 0.5, 1.0,
+    )
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, tags):
+        if not tags:
+            return name, ()
+        return name, tuple(sorted(tags.items()))
+
+    def increment(self, name, value=1, tags=None):
+        key = self._key(name, tags)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, tags=None):
+        key = self._key(name, tags)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def counter(self, name, **tags):
+        return self.counters.get(self._key(name, tags), 0)
+
+    def histogram(self, name, **tags):
+        return self.histograms.get(self._key(name, tags))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [
+                    {'name': name, 'tags': dict(tags), 'value': value}
+                    for (name, tags), value in self.counters.items()
+                ],
+                'histograms': [
+                    dict(histogram.as_dict(), name=name, tags=dict(tags))
+                    for (name, tags), histogram in self.histograms.items()
+                ],
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+sink = MetricsSink()
+
+
+def set_sink(new_sink):
+    """
+    Installs a metrics sink. None restores the no-op default.
+    """
+    global sink, enabled
+    sink = MetricsSink() if new_sink is None else new_sink
+    enabled = type(sink) is not MetricsSink
+
+
+def increment(name, value=1, tags=None):
+    sink.increment(name, value, tags)
+
+
+def observe(name, seconds, tags=None):
+    sink.observe(name, seconds, tags)
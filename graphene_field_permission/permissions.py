@@ -1,23 +1,71 @@
 import logging
-from . import api
+import time
+from . import api, metrics, versions
+from .cache import LRUCache, user_key
 
 logger = logging.getLogger(__name__)
 
 
 class PermissionsMiddleware():
+    # Set cache_ttl to share permissions between a user's requests until
+    # their version is bumped (see signals.connect_permission_signals) or the
+    # ttl expires. Versions are process local, so with several workers a
+    # change seen by one worker leaves the others stale for up to cache_ttl.
+    # None, the default, loads permissions once per request.
+    cache_ttl = None
+    cache_max_entries = 10000
+
+    def __init__(self):
+        self.cache = None
+        if self.cache_ttl is not None:
+            self.cache = LRUCache(
+                ttl=self.cache_ttl,
+                max_entries=self.cache_max_entries,
+            )
+
     def on_error(self, error):
         logger.error(error)
 
+    def get_permissions(self, user):
+        if self.cache is None:
+            return self.fetch_permissions(user)
+
+        key = user_key(user)
+        version = versions.get_version(user)
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] == version:
+            if metrics.enabled:
+                metrics.increment('middleware.cache_hits')
+            return entry[1]
+
+        if metrics.enabled:
+            metrics.increment('middleware.cache_misses')
+        permissions = self.fetch_permissions(user)
+        self.cache.set(key, (version, permissions))
+        return permissions
+
+    def fetch_permissions(self, user):
+        if not metrics.enabled:
+            return api.fetch_permissions(user)
+        start = time.perf_counter()
+        permissions = api.fetch_permissions(user)
+        metrics.observe(
+            'middleware.fetch_seconds',
+            time.perf_counter() - start
+        )
+        return permissions
+
     def resolve(self, next, root, info, **kwargs):
-        # have to check 'id' because AnonymousUser is
-        # considered authed for some reason
-        # TODO: run some benchmarks on this to see if better to
-        # have it be try/except based
-        if info.context.user.id:
-            if not hasattr(self, 'permissions'):
-                self.permissions = api.fetch_permissions(
-                    info.context.user
-                )
-            info.context.user_permissions = self.permissions
+        context = info.context
+        try:
+            # already loaded for this request
+            context.permissions
+        except AttributeError:
+            # have to check 'id' because AnonymousUser is
+            # considered authed for some reason
+            if context.user.id:
+                permissions = self.get_permissions(context.user)
+                context.permissions = permissions
+                context.user_permissions = permissions
 
         return next(root, info, **kwargs)
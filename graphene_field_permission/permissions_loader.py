@@ -1,33 +1,110 @@
 import importlib
 import logging
+import os
+import threading
 logger = logging.getLogger(__name__)
 
+# resolved permissions method, see get_permissions_method/configure/reset
+_permissions_method = None
+# resolved bulk permissions method, None when not configured
+_unresolved = object()
+_bulk_permissions_method = _unresolved
+# where options are read from, None for Django's settings
+_settings_provider = None
+_lock = threading.Lock()
+
+
+class SettingsProvider:
+    """
+    Source of the GRAPHENE_FIELD_PERMISSION options: SRC_MODULE, SRC_METHOD
+    and optionally SRC_BULK_METHOD. Subclass it for other frameworks, e.g.
+    to read a Flask app's config, and install it with configure().
+    """
+    def get_options(self):
+        """
+        Returns the options dict.
+        :raises ImportError when the settings aren't available
+        """
+        raise NotImplementedError
+
+
+class DjangoSettings(SettingsProvider):
+    """
+    settings.GRAPHENE_FIELD_PERMISSION, the default. django.conf is only
+    imported when the options are read.
+    """
+    def get_options(self):
+        from django.conf import settings
+        return settings.GRAPHENE_FIELD_PERMISSION
+
+
+class DictSettings(SettingsProvider):
+    def __init__(self, options):
+        self.options = dict(options)
+
+    def get_options(self):
+        return self.options
+
+
+class EnvironSettings(SettingsProvider):
+    """
+    Options from GRAPHENE_FIELD_PERMISSION_SRC_MODULE etc. environment
+    variables.
+    """
+    prefix = 'GRAPHENE_FIELD_PERMISSION_'
+
+    def __init__(self, environ=None):
+        self.environ = os.environ if environ is None else environ
+
+    def get_options(self):
+        return {
+            name[len(self.prefix):]: value
+            for name, value in self.environ.items()
+            if name.startswith(self.prefix)
+        }
+
 
 def import_django_settings():
-    from django.conf import settings
-    config = settings.GRAPHENE_FIELD_PERMISSION
+    config = DjangoSettings().get_options()
     return config['SRC_MODULE'], config['SRC_METHOD']
 
 
-def import_settings():
+def import_options(provider=None):
+    """
+    Reads the options from provider, by default the configured one, or
+    Django's settings when neither is set.
+    """
+    if provider is None:
+        provider = _settings_provider
+    if provider is not None:
+        return provider.get_options()
     try:
-        return import_django_settings()
-    except ImportError as exc:
+        return DjangoSettings().get_options()
+    except ImportError:
         logger.debug("django.conf not imported.")
 
-    # TODO: other frameworks here
+    error_msg = 'No configured settings found. Use configure() outside Django.'
+    raise ImportError(error_msg)
 
-    raise ImportError('No configured settings found.')
 
+def import_settings(provider=None):
+    config = import_options(provider)
+    return config['SRC_MODULE'], config['SRC_METHOD']
 
-def get_permissions_method():
+
+def import_bulk_settings(provider=None):
+    config = import_options(provider)
+    return config['SRC_MODULE'], config.get('SRC_BULK_METHOD')
+
+
+def resolve_permissions_method(provider=None):
     try:
-        src_mod, src_method = import_settings()
+        src_mod, src_method = import_settings(provider)
     except ImportError as exc1:
         error_msg = 'Failed to import any settings. Check your config.'
         raise Exception(error_msg) from exc1
     except AttributeError as exc2:
-        error_msg = 'missing GRAPHENE_FIELD_PERMISSION in django.conf.'
+        error_msg = 'missing GRAPHENE_FIELD_PERMISSION in settings.'
         raise Exception(error_msg) from exc2
     except KeyError as exc3:
         error_msg = 'missing GRAPHENE_FIELD_PERMISSION values.'
@@ -38,4 +115,113 @@ def get_permissions_method():
         error_msg = "UserPermissions module not found at {}"
         raise Exception(error_msg.format(src_mod)) from exc
 
-    return getattr(permissions_helper, src_method, None)
+    permissions_method = getattr(permissions_helper, src_method, None)
+    if not callable(permissions_method):
+        error_msg = "UserPermissions method {} not found in {}"
+        raise Exception(error_msg.format(src_method, src_mod))
+    return permissions_method
+
+
+def resolve_bulk_permissions_method(provider=None):
+    """
+    Returns the SRC_BULK_METHOD from settings, or None when it isn't set.
+    """
+    try:
+        src_mod, src_method = import_bulk_settings(provider)
+    except (ImportError, AttributeError, KeyError):
+        logger.debug("No bulk permissions method settings.")
+        return None
+    if src_method is None:
+        return None
+    try:
+        permissions_helper = importlib.import_module(src_mod)
+    except Exception as exc:
+        error_msg = "UserPermissions module not found at {}"
+        raise Exception(error_msg.format(src_mod)) from exc
+
+    bulk_permissions_method = getattr(permissions_helper, src_method, None)
+    if not callable(bulk_permissions_method):
+        error_msg = "Bulk permissions method {} not found in {}"
+        raise Exception(error_msg.format(src_method, src_mod))
+    return bulk_permissions_method
+
+
+def get_permissions_method():
+    """
+    Returns the configured permissions method, resolving it from settings on
+    first use.
+    """
+    permissions_method = _permissions_method
+    if permissions_method is None:
+        permissions_method = configure()
+    return permissions_method
+
+
+def is_configured():
+    """
+    True once a permissions method is set, by configure() or on first use.
+    """
+    return _permissions_method is not None
+
+
+def get_bulk_permissions_method():
+    """
+    Returns the configured bulk permissions method, or None if there isn't
+    one. It takes a list of users and returns a dict of user pk -> the
+    permissions the permissions method would return for that user.
+    """
+    global _bulk_permissions_method
+    bulk_permissions_method = _bulk_permissions_method
+    if bulk_permissions_method is _unresolved:
+        with _lock:
+            if _bulk_permissions_method is _unresolved:
+                _bulk_permissions_method = resolve_bulk_permissions_method()
+            bulk_permissions_method = _bulk_permissions_method
+    return bulk_permissions_method
+
+
+def configure(loader=None, bulk_loader=None, options=None, settings=None):
+    """
+    Sets the permissions method, or resolves and validates it from settings
+    when none is passed. Call at startup to fail fast on bad config, and
+    outside Django, where Django's settings aren't read:
+
+        configure(loader=get_user_permissions)
+        configure(options={'SRC_MODULE': ..., 'SRC_METHOD': ...})
+
+    :param loader: the permissions method
+    :param bulk_loader: the bulk permissions method used by
+    api.fetch_permissions_many, read from settings too when loader isn't
+    passed
+    :param options: dict of settings to read instead of Django's
+    :param settings: a SettingsProvider to read settings from
+    :raises Exception when the settings can't be resolved, leaving the
+    previous configuration in place
+    """
+    global _permissions_method, _bulk_permissions_method, _settings_provider
+    with _lock:
+        if options is not None:
+            settings = DictSettings(options)
+        provider = _settings_provider if settings is None else settings
+        # resolved before anything is installed so bad settings don't stick
+        if loader is None:
+            loader = resolve_permissions_method(provider)
+            if bulk_loader is None:
+                bulk_loader = resolve_bulk_permissions_method(provider)
+        _settings_provider = provider
+        _permissions_method = loader
+        _bulk_permissions_method = bulk_loader
+    return loader
+
+
+def reset():
+    """
+    Forgets the resolved permissions method and settings provider so the
+    next use resolves them again, e.g. after settings change in tests or on
+    reload.
+    """
+    global _permissions_method, _bulk_permissions_method, _settings_provider
+    with _lock:
+        _permissions_method = None
+        _bulk_permissions_method = _unresolved
+        _settings_provider = None
@@ -0,0 +1,325 @@
+import hashlib
+import logging
+from . import api, engine
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def get_field_access(resolver):
+    """
+    Returns the has_field_access decorating a resolver, looking through
+    functools.partial and functools.wraps layers, or None.
+    """
+    seen = set()
+    while resolver is not None and id(resolver) not in seen:
+        seen.add(id(resolver))
+        field_access = getattr(resolver, 'field_access', None)
+        if field_access is not None:
+            return field_access
+        resolver = getattr(resolver, 'func', None) or \
+            getattr(resolver, '__wrapped__', None)
+    return None
+
+
+def _named_type(type_):
+    while hasattr(type_, 'of_type'):
+        type_ = type_.of_type
+    return type_
+
+
+def _walk(schema, parent_type, selection_set, fragments, seen, guarded):
+    for selection in selection_set.selections:
+        kind = selection.kind
+        if kind == 'field':
+            fields = getattr(parent_type, 'fields', None) or {}
+            field = fields.get(selection.name.value)
+            if field is None:
+                # __typename and friends
+                continue
+            field_access = get_field_access(field.resolve)
+            if field_access is not None:
+                guarded.append(
+                    (parent_type.name, selection.name.value, field_access)
+                )
+            if selection.selection_set is not None:
+                _walk(schema, _named_type(field.type),
+                      selection.selection_set, fragments, seen, guarded)
+        elif kind == 'inline_fragment':
+            type_ = parent_type
+            if selection.type_condition is not None:
+                type_ = schema.get_type(selection.type_condition.name.value)
+            _walk(schema, type_, selection.selection_set,
+                  fragments, seen, guarded)
+        elif kind == 'fragment_spread':
+            name = selection.name.value
+            if name in seen or name not in fragments:
+                continue
+            seen.add(name)
+            fragment = fragments[name]
+            type_ = schema.get_type(fragment.type_condition.name.value)
+            _walk(schema, type_, fragment.selection_set,
+                  fragments, seen, guarded)
+
+
+def _included(selection, variables):
+    # @skip(if: ...) and @include(if: ...), with literal or variable values
+    for directive in getattr(selection, 'directives', None) or ():
+        name = directive.name.value
+        if name not in ('skip', 'include'):
+            continue
+        value = None
+        for argument in directive.arguments:
+            if argument.name.value == 'if':
+                value = argument.value
+        if getattr(value, 'kind', None) == 'variable':
+            value = (variables or {}).get(value.name.value)
+        else:
+            value = getattr(value, 'value', value)
+        if (name == 'skip') == bool(value):
+            return False
+    return True
+
+
+def _forbidden(schema, parent_type, selection_set, fragments, variables,
+               verdicts, seen):
+    # True when nothing the selection set includes can be resolved: every
+    # field is guarded and denied, or only selects such fields itself
+    included = False
+    for selection in selection_set.selections:
+        if not _included(selection, variables):
+            continue
+        kind = selection.kind
+        if kind == 'field':
+            fields = getattr(parent_type, 'fields', None) or {}
+            field = fields.get(selection.name.value)
+            if field is None:
+                # __typename and friends are always readable
+                return False
+            verdict = verdicts.get((parent_type.name, selection.name.value))
+            if verdict is False and \
+                    get_field_access(field.resolve) is not None:
+                included = True
+                continue
+            if selection.selection_set is None:
+                return False
+            if not _forbidden(schema, _named_type(field.type),
+                              selection.selection_set, fragments,
+                              variables, verdicts, seen):
+                return False
+            included = True
+            continue
+        if kind == 'inline_fragment':
+            type_ = parent_type
+            if selection.type_condition is not None:
+                type_ = schema.get_type(selection.type_condition.name.value)
+            selections = selection.selection_set
+            fragment_seen = seen
+        else:
+            name = selection.name.value
+            if name in seen or name not in fragments:
+                continue
+            fragment = fragments[name]
+            type_ = schema.get_type(fragment.type_condition.name.value)
+            selections = fragment.selection_set
+            fragment_seen = seen | {name}
+        if not _forbidden(schema, type_, selections, fragments, variables,
+                          verdicts, fragment_seen):
+            return False
+        included = True
+    return included
+
+
+def forbidden(schema, operation, verdicts, fragments=None, variables=None):
+    """
+    True when every field the operation selects, honouring @skip and
+    @include, is a guarded field denied by verdicts from preauthorize, or
+    only selects such fields. Readable fields such as an unguarded id keep
+    the operation allowed.
+    """
+    operation_type = getattr(operation.operation, 'value', operation.operation)
+    root_type = getattr(schema, '{}_type'.format(operation_type))
+    return _forbidden(schema, root_type, operation.selection_set,
+                      fragments or {}, variables, verdicts, frozenset())
+
+
+def guarded_fields(schema, operation, fragments=None):
+    """
+    Walks a parsed GraphQL operation and returns a
+    (type name, field name, has_field_access) tuple for every field it
+    selects whose resolver is decorated with has_field_access.
+    """
+    operation_type = getattr(operation.operation, 'value', operation.operation)
+    root_type = getattr(schema, '{}_type'.format(operation_type))
+    guarded = []
+    _walk(schema, root_type, operation.selection_set,
+          fragments or {}, set(), guarded)
+    return guarded
+
+
+def document_key(operation):
+    """
+    Hash of the operation's source document and name, or None when the
+    operation was parsed without locations.
+    """
+    loc = getattr(operation, 'loc', None)
+    if loc is None or loc.source is None:
+        return None
+    body = loc.source.body.encode('utf-8')
+    name = operation.name.value if operation.name is not None else None
+    return hashlib.blake2b(body, digest_size=16).digest(), name
+
+
+class PlanCache:
+    """
+    LRU cache of authorization plans keyed by
+    (document hash, permissions fingerprint). A plan holds the decision for
+    every guarded field of the operation, so repeated queries from users
+    with the same permissions skip the checks entirely.
+    """
+    def __init__(self, max_entries=1000):
+        self.entries = LRUCache(max_entries=max_entries)
+
+    def key(self, operation, user_permissions):
+        document = document_key(operation)
+        if document is None:
+            return None
+        return document, engine.fingerprint(user_permissions)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, plan):
+        self.entries.set(key, plan)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def _build_plan(schema, operation, fragments, user_permissions, info_context):
+    plan = []
+    decisions = api.get_decisions(info_context)
+    for type_name, field_name, field_access in guarded_fields(
+            schema, operation, fragments):
+        if field_access.filter_path is not None:
+            plan.append((type_name, field_name, None, None))
+            continue
+        requirement = field_access.requirement
+        try:
+            api._decide(
+                (requirement,),
+                user_permissions,
+                None,
+                info_context
+            )
+        except PermissionError:
+            pass
+        # only the verdict is kept, plans are shared between users and the
+        # denial holds this user's permissions
+        plan.append((
+            type_name,
+            field_name,
+            requirement,
+            decisions[(requirement, None)] is True
+        ))
+    return plan
+
+
+def preauthorize(schema, operation, fragments, info_context,
+                 plan_cache=None):
+    """
+    Evaluates the requirements of every guarded field in the operation that
+    doesn't depend on a filter_field against the user's permissions. The
+    decisions are recorded in the request's decision memo that
+    check_field_access reads, so the decorators only do a lookup.
+    :param plan_cache: optional PlanCache shared between requests
+    :returns dict of (type name, field name) -> True/False, or None for
+    fields that depend on a filter_field and are checked per object
+    """
+    user_permissions = api.get_context_permissions(info_context)
+    key = None
+    plan = None
+    if plan_cache is not None:
+        key = plan_cache.key(operation, user_permissions)
+        if key is not None:
+            plan = plan_cache.get(key)
+
+    if plan is None:
+        plan = _build_plan(
+            schema,
+            operation,
+            fragments,
+            user_permissions,
+            info_context
+        )
+        if key is not None:
+            plan_cache.set(key, plan)
+    else:
+        decisions = api.get_decisions(info_context)
+        for _, _, requirement, allowed in plan:
+            if requirement is not None and \
+                    (requirement, None) not in decisions:
+                decisions[(requirement, None)] = True if allowed else \
+                    api.AccessDenied(requirement.permissions)
+
+    verdicts = {}
+    for type_name, field_name, requirement, allowed in plan:
+        if requirement is None:
+            verdicts.setdefault((type_name, field_name), None)
+        else:
+            verdicts[(type_name, field_name)] = allowed
+    return verdicts
+
+
+class PreAuthorizationMiddleware:
+    """
+    Graphene middleware authorizing the whole document before the first
+    resolver runs. With reject_forbidden set, an operation that selects
+    nothing but denied guarded fields fails before any resolver does ORM
+    work.
+    """
+    reject_forbidden = True
+    # set to a PlanCache to share plans between requests
+    plan_cache = None
+
+    def resolve(self, next, root, info, **kwargs):
+        context = info.context
+        state = getattr(context, 'permission_preauth', None)
+        if state is None or state[0] is not info.operation:
+            state = (info.operation, self.authorize(info))
+            context.permission_preauth = state
+
+        error = state[1]
+        if error is not None and info.path.prev is None:
+            raise error.with_traceback(None)
+        return next(root, info, **kwargs)
+
+    def authorize(self, info):
+        context = info.context
+        # have to check 'id' because AnonymousUser is
+        # considered authed for some reason
+        if not context.user.id:
+            return None
+        verdicts = preauthorize(
+            info.schema,
+            info.operation,
+            info.fragments,
+            context,
+            plan_cache=self.plan_cache,
+        )
+        context.permission_verdicts = verdicts
+        if not self.reject_forbidden or not forbidden(
+                info.schema,
+                info.operation,
+                verdicts,
+                info.fragments,
+                getattr(info, 'variable_values', None),
+        ):
+            return None
+        denied = ', '.join(
+            "'{}'".format(field_name)
+            for (_, field_name), verdict in verdicts.items()
+            if verdict is False
+        )
+        error_msg = "No access for user on fields {}"
+        return Exception(error_msg.format(denied))
@@ -0,0 +1,113 @@
+from collections import namedtuple
+from functools import lru_cache
+from . import registry
+
+QueryHints = namedtuple('QueryHints', ['select_related', 'only'])
+
+
+def _model_path(model, filter_list):
+    # how many leading hops of the path are forward foreign keys or
+    # one-to-ones select_related can follow, and whether the whole path is
+    # a field only() accepts. Properties, reverse foreign keys and many to
+    # many relations would raise FieldError.
+    try:
+        from django.core.exceptions import FieldDoesNotExist
+    except ImportError:
+        return len(filter_list) - 1, True
+    relations = 0
+    last = len(filter_list) - 1
+    for index, name in enumerate(filter_list):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return relations, False
+        if index == last:
+            return relations, not (field.one_to_many or field.many_to_many)
+        if not (field.many_to_one or field.one_to_one) or \
+                field.related_model is None:
+            return relations, False
+        relations += 1
+        model = field.related_model
+    return relations, True
+
+
+def hints_for_paths(filter_fields, model=None):
+    """
+    Django queryset hints loading everything the filter_field paths
+    traverse with the node: the related objects for select_related, and the
+    field paths for only.
+    :param model: the queryset's model. Each path is checked against it and
+    only followed as far as it's a chain of forward foreign keys or
+    one-to-ones, as filter_field may also name properties or reverse and
+    many to many relations.
+    """
+    select_related = []
+    only = []
+    for filter_field in filter_fields:
+        filter_list = filter_field.split('.')
+        if model is None:
+            relations, complete = len(filter_list) - 1, True
+        else:
+            relations, complete = _model_path(model, filter_list)
+        if relations:
+            related = '__'.join(filter_list[:relations])
+            if related not in select_related:
+                select_related.append(related)
+        # related objects that are selected mustn't be deferred
+        field = '__'.join(filter_list if complete else filter_list[:relations])
+        if field and field not in only:
+            only.append(field)
+    return QueryHints(tuple(select_related), tuple(only))
+
+
+def filter_field_hints(type_name, model=None):
+    """
+    QueryHints for the filter_fields registered on a graphene type's
+    has_field_access resolvers.
+    :param model: the model to check the paths against, see hints_for_paths
+    """
+    return _filter_field_hints(type_name, registry.generation(), model)
+
+
+@lru_cache(maxsize=1024)
+def _filter_field_hints(type_name, generation, model):
+    return hints_for_paths(registry.filter_fields(type_name), model)
+
+
+def apply_filter_field_hints(queryset, type_name, only=None):
+    """
+    Applies the type's filter_field hints to a queryset so permission checks
+    on its nodes don't lazy load related objects.
+    :param only: the fields the type itself needs. When given the queryset is
+    limited to them plus the filter_field paths, otherwise every field is
+    loaded as before.
+    """
+    hints = filter_field_hints(type_name, getattr(queryset, 'model', None))
+    if hints.select_related:
+        queryset = queryset.select_related(*hints.select_related)
+    if only is not None:
+        queryset = queryset.only(*tuple(only) + hints.only)
+    return queryset
+
+
+class FilterFieldHintsMixin:
+    """
+    Mixin for graphene-django DjangoObjectTypes applying their filter_field
+    hints in get_queryset:
+
+        class GroupNode(FilterFieldHintsMixin, DjangoObjectType):
+            ...
+
+    Set `filter_field_only` to a list of the type's own fields to also
+    limit the columns loaded.
+    """
+    filter_field_only = None
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        queryset = super().get_queryset(queryset, info)
+        return apply_filter_field_hints(
+            queryset,
+            cls.__name__,
+            only=cls.filter_field_only,
+        )
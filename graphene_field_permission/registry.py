@@ -0,0 +1,229 @@
+import itertools
+import threading
+from collections import namedtuple
+from . import engine
+from .cache import LRUCache
+from .lazy import LazyGroupPermissions
+
+FieldRequirement = namedtuple(
+    'FieldRequirement',
+    [
+        'type_name',
+        'field_name',
+        'requirement',
+        'filter_field',
+        'graphql_type_name',
+        'graphql_field_name',
+    ]
+)
+
+# (type name, field name) -> FieldRequirement, filled in as has_field_access
+# decorates resolvers at schema import. Keyed by the Python names, the names
+# the schema exposes are only known once it's built, see use_schema
+_fields = {}
+_lock = threading.Lock()
+# bumped on every registration so cached projections are never stale
+_generation = itertools.count()
+_current_generation = next(_generation)
+_projections = LRUCache(max_entries=1000)
+
+
+def type_name_of(func):
+    """
+    Name of the class a resolver is defined on, from its __qualname__, or
+    None for functions that aren't methods.
+    """
+    parts = func.__qualname__.split('.')
+    if len(parts) < 2 or parts[-2] == '<locals>':
+        return None
+    return parts[-2]
+
+
+def field_name_of(func):
+    """
+    Name of the field a resolver resolves, its name without resolve_.
+    """
+    return '_'.join(func.__name__.split('_')[1:])
+
+
+def to_camel_case(snake_str):
+    """
+    graphene's default conversion of field names for the schema.
+    """
+    components = snake_str.split('_')
+    return components[0] + ''.join(
+        x.capitalize() if x else '_' for x in components[1:]
+    )
+
+
+def register(type_name, field_name, field_access):
+    global _current_generation
+    entry = FieldRequirement(
+        type_name,
+        field_name,
+        field_access.requirement,
+        field_access.filter_field,
+        # graphene's defaults until use_schema finds the actual names
+        type_name,
+        to_camel_case(field_name),
+    )
+    with _lock:
+        _fields[(type_name, field_name)] = entry
+        _current_generation = next(_generation)
+
+
+def _resolver_key(resolver):
+    # the (type name, field name) a has_field_access resolver was registered
+    # under, looking through functools.partial and functools.wraps layers
+    seen = set()
+    while resolver is not None and id(resolver) not in seen:
+        seen.add(id(resolver))
+        func = getattr(resolver, '__wrapped__', None)
+        if getattr(resolver, 'field_access', None) is not None and \
+                func is not None:
+            return type_name_of(func), field_name_of(func)
+        resolver = getattr(resolver, 'func', None) or func
+    return None
+
+
+def use_schema(schema):
+    """
+    Records the names the built schema exposes the registered fields under,
+    e.g. a type's Meta.name or camelCase field names, resolving each schema
+    field back to its has_field_access resolver.
+    :param schema: a graphene Schema or graphql-core GraphQLSchema
+    :return the number of fields matched
+    """
+    global _current_generation
+    type_map = getattr(schema, 'graphql_schema', schema).type_map
+    matched = 0
+    with _lock:
+        for graphql_type_name, graphql_type in type_map.items():
+            if graphql_type_name.startswith('__'):
+                continue
+            fields = getattr(graphql_type, 'fields', None) or {}
+            for graphql_field_name, field in fields.items():
+                key = _resolver_key(getattr(field, 'resolve', None))
+                if key not in _fields:
+                    continue
+                _fields[key] = _fields[key]._replace(
+                    graphql_type_name=graphql_type_name,
+                    graphql_field_name=graphql_field_name,
+                )
+                matched += 1
+        _current_generation = next(_generation)
+    return matched
+
+
+def get_field(type_name, field_name):
+    """
+    Returns the FieldRequirement by its Python names, the resolver's class
+    and field name, or by the names the schema exposes.
+    """
+    entry = _fields.get((type_name, field_name))
+    if entry is not None:
+        return entry
+    for entry in list(_fields.values()):
+        if entry.graphql_type_name == type_name and \
+                entry.graphql_field_name == field_name:
+            return entry
+    return None
+
+
+def get_fields(type_name=None):
+    """
+    Returns the registered FieldRequirements, optionally only those of one
+    type, by its Python or GraphQL name.
+    """
+    return [
+        entry for entry in list(_fields.values())
+        if type_name is None or type_name in (
+            entry.type_name,
+            entry.graphql_type_name,
+        )
+    ]
+
+
+def filter_fields(type_name):
+    """
+    Returns the distinct filter_field paths declared by the type's
+    has_field_access resolvers, in registration order.
+    """
+    paths = []
+    for entry in get_fields(type_name):
+        if entry.filter_field is not None and entry.filter_field not in paths:
+            paths.append(entry.filter_field)
+    return tuple(paths)
+
+
+def generation():
+    """
+    Changes whenever the registry does, for caching derived data.
+    """
+    return _current_generation
+
+
+def clear():
+    global _current_generation
+    with _lock:
+        _fields.clear()
+        _current_generation = next(_generation)
+    _projections.clear()
+
+
+def _group_mask(user_permissions):
+    # everything the user holds in any group, None when it can't be known
+    # without loading every group
+    if isinstance(user_permissions, LazyGroupPermissions):
+        return None
+    if not isinstance(user_permissions, dict):
+        return 0
+    mask = 0
+    for group_permissions in user_permissions.values():
+        mask |= engine.mask_of(group_permissions)
+    return mask
+
+
+def _project(mask, group_mask, graphql_names):
+    projection = {}
+    for entry in get_fields():
+        if entry.filter_field is None:
+            if not entry.requirement.mask & mask:
+                continue
+            verdict = True
+        else:
+            if group_mask is not None and \
+                    not entry.requirement.mask & group_mask:
+                continue
+            verdict = None
+        if graphql_names:
+            type_name = entry.graphql_type_name
+            field_name = entry.graphql_field_name
+        else:
+            type_name = entry.type_name
+            field_name = entry.field_name
+        projection.setdefault(type_name, {})[field_name] = verdict
+    return projection
+
+
+def visible_fields(user_permissions, graphql_names=False):
+    """
+    Returns the registered fields the permissions may see, without running
+    any resolvers, as {type name: {field name: True or None}}. True fields
+    are always visible; None fields depend on a filter_field and are
+    visible for some of the objects, those checked per object. Fields that
+    are always denied are left out.
+
+    Projections are cached per permissions fingerprint and shared, don't
+    modify them.
+    :param graphql_names: key the projection by the names the schema
+    exposes, as clients see them, instead of the Python names
+    """
+    mask = engine.mask_of(user_permissions)
+    group_mask = _group_mask(user_permissions)
+    key = (generation(), mask, group_mask, graphql_names)
+    projection = _projections.get(key)
+    if projection is None:
+        projection = _project(mask, group_mask, graphql_names)
+        _projections.set(key, projection)
+    return projection
@@ -0,0 +1,51 @@
+class ScopeIndex:
+    """
+    Hierarchy of filter ids, e.g. group -> division -> corporation, with
+    each id's ancestor chain precomputed. Installed with
+    api.set_scope_index(), a grant on an id applies to all its descendants
+    and a check looks up at most depth + 1 ids.
+    :param parents: mapping of child id -> parent id, None for roots
+    """
+    def __init__(self, parents):
+        parents = {
+            str(child): None if parent is None else str(parent)
+            for child, parent in dict(parents).items()
+        }
+        self.chains = {}
+        for scope_id in parents:
+            self._build(scope_id, parents, ())
+
+    @classmethod
+    def from_edges(cls, edges):
+        """
+        :param edges: iterable of (child id, parent id) pairs
+        """
+        return cls(dict(edges))
+
+    def _build(self, scope_id, parents, visiting):
+        chain = self.chains.get(scope_id)
+        if chain is not None:
+            return chain
+        if scope_id in visiting:
+            error_msg = 'Cycle in scope hierarchy at {}'
+            raise ValueError(error_msg.format(scope_id))
+        parent = parents.get(scope_id)
+        if parent is None:
+            chain = (scope_id,)
+        else:
+            chain = (scope_id,) + self._build(
+                parent,
+                parents,
+                visiting + (scope_id,)
+            )
+        self.chains[scope_id] = chain
+        return chain
+
+    def chain(self, scope_id):
+        """
+        Returns the id followed by its ancestors, nearest first.
+        """
+        return self.chains.get(scope_id) or (scope_id,)
+
+    def __len__(self):
+        return len(self.chains)
@@ -0,0 +1,149 @@
+import struct
+from . import engine
+
+# Layout, all little endian:
+#   header       magic, format version, kind, index width ('H' or 'I')
+#   names        count, then (length, utf-8 bytes) per permission name
+#   kind FLAT    nothing further, the set is every name in the table
+#   kind GROUPED count, then per group: key tag, key, index count, indices
+# Permission names are stored once however many groups use them, and groups
+# refer to them by their index in the table.
+MAGIC = b'GFPS'
+VERSION = 1
+FLAT = 0
+GROUPED = 1
+STR_KEY = 0
+INT_KEY = 1
+
+_header = struct.Struct('<4sBBc')
+_count = struct.Struct('<I')
+_length = struct.Struct('<H')
+_int_key = struct.Struct('<q')
+_tag = struct.Struct('<B')
+
+
+def _pack_string(parts, value):
+    encoded = value.encode('utf-8')
+    parts.append(_length.pack(len(encoded)))
+    parts.append(encoded)
+
+
+def _pack_group_key(parts, group):
+    if isinstance(group, str):
+        parts.append(_tag.pack(STR_KEY))
+        _pack_string(parts, group)
+    elif isinstance(group, int) and not isinstance(group, bool):
+        parts.append(_tag.pack(INT_KEY))
+        parts.append(_int_key.pack(group))
+    else:
+        raise TypeError('Unsupported group key {!r}'.format(group))
+
+
+def dumps(permissions):
+    """
+    Encodes restructured permissions, a PermissionSet or a
+    {group: PermissionSet} dict with str or int groups. Names are written
+    rather than interned ids, which are only valid within a process.
+    Returns None for permissions that can't be shared, e.g.
+    lazy.LazyGroupPermissions.
+    """
+    if isinstance(permissions, engine.PermissionSet):
+        kind = FLAT
+        names = sorted(permissions)
+    elif isinstance(permissions, dict):
+        kind = GROUPED
+        names = sorted({
+            name for group in permissions.values() for name in group
+        })
+    else:
+        return None
+
+    width = b'H' if len(names) <= 0xFFFF else b'I'
+    parts = [_header.pack(MAGIC, VERSION, kind, width)]
+    parts.append(_count.pack(len(names)))
+    for name in names:
+        _pack_string(parts, name)
+
+    if kind == GROUPED:
+        index = {name: position for position, name in enumerate(names)}
+        parts.append(_count.pack(len(permissions)))
+        for group, group_permissions in permissions.items():
+            _pack_group_key(parts, group)
+            positions = sorted(index[name] for name in group_permissions)
+            parts.append(_count.pack(len(positions)))
+            parts.append(struct.pack(
+                '<{}{}'.format(len(positions), width.decode('ascii')),
+                *positions
+            ))
+    return b''.join(parts)
+
+
+def _unpack_string(view, offset):
+    length, = _length.unpack_from(view, offset)
+    offset += _length.size
+    return str(view[offset:offset + length], 'utf-8'), offset + length
+
+
+def loads(data):
+    """
+    Decodes dumps() output, read in place from any bytes-like object.
+    Raises ValueError for data in another format or version.
+    """
+    view = memoryview(data)
+    try:
+        magic, version, kind, width = _header.unpack_from(view)
+    except struct.error:
+        raise ValueError('Truncated permissions data')
+    if magic != MAGIC or version != VERSION:
+        error_msg = 'Unsupported permissions data {!r} version {}'
+        raise ValueError(error_msg.format(bytes(magic), version))
+
+    try:
+        return _decode(view, kind, width.decode('ascii'))
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError('Malformed permissions data: {}'.format(e))
+
+
+def _decode(view, kind, width):
+    offset = _header.size
+    count, = _count.unpack_from(view, offset)
+    offset += _count.size
+    # one bit per table entry, so a group's mask is an OR of lookups
+    bits = []
+    for _ in range(count):
+        name, offset = _unpack_string(view, offset)
+        bits.append(1 << engine.intern(name))
+
+    if kind == FLAT:
+        mask = 0
+        for bit in bits:
+            mask |= bit
+        return engine.PermissionSet(mask=mask)
+    if kind != GROUPED:
+        raise ValueError('Unknown permissions kind {}'.format(kind))
+
+    index_size = struct.calcsize('<' + width)
+    groups, = _count.unpack_from(view, offset)
+    offset += _count.size
+    permissions = {}
+    for _ in range(groups):
+        tag, = _tag.unpack_from(view, offset)
+        offset += _tag.size
+        if tag == STR_KEY:
+            group, offset = _unpack_string(view, offset)
+        elif tag == INT_KEY:
+            group, = _int_key.unpack_from(view, offset)
+            offset += _int_key.size
+        else:
+            raise ValueError('Unknown group key tag {}'.format(tag))
+
+        length, = _count.unpack_from(view, offset)
+        offset += _count.size
+        mask = 0
+        for position in struct.unpack_from(
+            '<{}{}'.format(length, width), view, offset
+        ):
+            mask |= bits[position]
+        offset += length * index_size
+        permissions[group] = engine.PermissionSet(mask=mask)
+    return permissions
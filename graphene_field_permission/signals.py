@@ -0,0 +1,35 @@
+from . import versions
+
+
+def _bump(users):
+    if users is None:
+        versions.bump_all()
+        return
+    for user in users:
+        versions.bump_version(user)
+
+
+def connect_permission_signals(*models, get_users=None):
+    """
+    Connects Django post_save/post_delete/m2m_changed handlers on the models
+    backing user permissions so cached permissions are reloaded after they
+    change.
+    :param models: permission models, and m2m through models
+    :param get_users: called with the signal's instance and keyword
+    arguments, returns the users affected. All users are marked stale when
+    it isn't set or returns None.
+    """
+    from django.db.models.signals import m2m_changed, post_delete, post_save
+
+    def on_change(sender, instance, **kwargs):
+        action = kwargs.get('action')
+        if action is not None and not action.startswith('post_'):
+            return
+        users = None if get_users is None else get_users(instance, **kwargs)
+        _bump(users)
+
+    for model in models:
+        post_save.connect(on_change, sender=model, weak=False)
+        post_delete.connect(on_change, sender=model, weak=False)
+        m2m_changed.connect(on_change, sender=model, weak=False)
+    return on_change
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from . import metrics
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'aborted')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.aborted = False
+
+
+def _copy_error(error):
+    # raising the load's exception object for every caller would have them
+    # rewrite its shared __traceback__ and __context__, so each gets a copy
+    # of the same type, chained to the original. __init__ isn't called as
+    # exceptions may take other arguments than they keep in args.
+    cls = type(error)
+    copied = cls.__new__(cls)
+    copied.args = error.args
+    state = getattr(error, '__dict__', None)
+    if state:
+        copied.__dict__.update(state)
+    return copied
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one. The first caller
+    runs the load, callers arriving while it's in flight wait for and share
+    its result or a copy of its exception. Nothing is kept once the load
+    finishes, so a failed load is retried by the next caller. A load
+    interrupted by a BaseException such as KeyboardInterrupt only raises in
+    its own caller, the waiting callers load again.
+    :param timeout: seconds a waiting caller waits before raising
+    TimeoutError, None to wait as long as the load takes. The load itself
+    isn't interrupted.
+    """
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def do(self, key, func, *args):
+        """
+        Returns func(*args), or the result of the call already in flight
+        for key in another thread.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if metrics.enabled:
+                metrics.increment('single_flight.waits')
+            if not call.done.wait(self.timeout):
+                error_msg = 'Timed out waiting for in-flight load of {!r}'
+                raise TimeoutError(error_msg.format(key))
+            if call.aborted:
+                return self.do(key, func, *args)
+            if call.error is not None:
+                raise _copy_error(call.error) from call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            # not for other threads to raise
+            call.aborted = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key, func, *args):
+        """
+        Awaits func(*args), or the call already in flight for key on the
+        running event loop. The load runs as its own task, so cancelling a
+        caller, even the first, doesn't cancel it for the others.
+        """
+        flight_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            task = self._calls.get(flight_key)
+            if task is None:
+                task = asyncio.ensure_future(func(*args))
+                self._calls[flight_key] = task
+                task.add_done_callback(
+                    lambda _: self._finish(flight_key, task)
+                )
+            elif metrics.enabled:
+                metrics.increment('single_flight.waits')
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            error_msg = 'Timed out waiting for in-flight load of {!r}'
+            raise TimeoutError(error_msg.format(key)) from None
+        except Exception as e:
+            # every caller awaits the same task and its exception object
+            if not task.done() or task.cancelled() or \
+                    task.exception() is not e:
+                raise
+            raise _copy_error(e) from e
+
+    def _finish(self, flight_key, task):
+        with self._lock:
+            if self._calls.get(flight_key) is task:
+                del self._calls[flight_key]
+        if not task.cancelled():
+            # retrieved here so an unawaited failure isn't logged as lost
+            task.exception()
@@ -60,6 +60,13 @@ def logger():
     return logging.getLogger('graphene_field_permission.permissions')
 
 
+@pytest.fixture
+def permissions_loader_reset():
+    graphene_field_permission.permissions_loader.reset()
+    yield
+    graphene_field_permission.permissions_loader.reset()
+
+
 @pytest.fixture
 def fetch_permissions_single_permissions(monkeypatch):
     monkeypatch.setattr(
@@ -1,4 +1,8 @@
+import asyncio
+import types
+import logging
 import pytest
+import graphene_field_permission.api
 import graphene_field_permission.permissions_loader
 from unittest.mock import Mock
 from graphene_field_permission.api import (
@@ -6,7 +10,20 @@ from graphene_field_permission.api import (
     get_filter_data, check_field_access,
     restructure_permissions,
     fetch_permissions,
+    fetch_permissions_many,
+    compile_filter_field,
+    FilterPath,
+    AccessDenied,
+    set_trace_sampling,
+    set_permissions_cache,
+    set_single_flight,
+    fetch_permissions_async,
+    check_field_access_async,
+    check_field_access_many,
 )
+from graphene_field_permission.cache import PermissionCache
+from graphene_field_permission.engine import compile_requirement
+from graphene_field_permission.singleflight import SingleFlight
 from graphene_field_permission.tests.fixtures import (
     group_permissions,
     single_permissions,
@@ -15,6 +32,7 @@ from graphene_field_permission.tests.fixtures import (
     user_permission_single_mock,
     structured_group_permission_data,
     structured_single_permission_data,
+    group_permission_data,
 )
 
 
@@ -76,6 +94,21 @@ class TestApi:
                 'two.steps.beyond'
             )
 
+    def test_compile_filter_field(self):
+        filter_path = compile_filter_field('group.division.corporation.id')
+        assert isinstance(filter_path, FilterPath)
+        assert compile_filter_field(
+            'group.division.corporation.id'
+        ) is filter_path
+
+        test_data = Mock()
+        test_data.group.division.corporation.id = 1234
+        assert filter_path(test_data) == '1234'
+        assert get_filter_data(test_data, filter_path) == '1234'
+
+        with pytest.raises(Exception, match='group not found'):
+            filter_path({})
+
     def test__has_access(self, user_permission_group_mock):
         assert _has_access(
             'permission1',
@@ -100,6 +133,55 @@ class TestApi:
                 user_permissions={'permission1': True},
             )
 
+    def test_access_denied_message(self):
+        with pytest.raises(AccessDenied) as exc:
+            _has_access(
+                'permission2',
+                user_permissions={'permission1': True},
+            )
+        assert exc.value.required_permissions == ('permission2',)
+        assert str(exc.value) == (
+            "no match found on ('permission2',) against {'permission1': True}"
+        )
+
+        # compiled requirements, as passed by has_field_access, read the same
+        with pytest.raises(AccessDenied) as exc:
+            _has_access(
+                compile_requirement('permission2'),
+                user_permissions={'permission1': True},
+            )
+        assert str(exc.value) == (
+            "no match found on ('permission2',) against {'permission1': True}"
+        )
+
+    def test_debug_switch(self, monkeypatch):
+        logger = graphene_field_permission.api.logger
+        monkeypatch.setattr(logger, 'isEnabledFor', Mock(return_value=True))
+        monkeypatch.setattr(logger, 'debug', Mock())
+        _has_access('permission1', user_permissions={'permission1': True})
+        assert logger.debug.called
+
+        logger.debug.reset_mock()
+        monkeypatch.setattr(graphene_field_permission.api, 'DEBUG', False)
+        _has_access('permission1', user_permissions={'permission1': True})
+        assert not logger.debug.called
+
+    def test_set_trace_sampling(self, caplog):
+        caplog.set_level(logging.INFO, logger='graphene_field_permission.api')
+        set_trace_sampling(1)
+        try:
+            _has_access('permission1', user_permissions={'permission1': True})
+        finally:
+            set_trace_sampling(0)
+        assert "trace: ('permission1',) on filter None granted" in caplog.text
+
+        caplog.clear()
+        _has_access('permission1', user_permissions={'permission1': True})
+        assert 'trace:' not in caplog.text
+
+        with pytest.raises(ValueError):
+            set_trace_sampling(-1)
+
     def test_restructure_permissions(
             self,
             user_permission_single_mock,
@@ -154,6 +236,130 @@ class TestApi:
             assert 'foo' not in permissions['test2'].keys()
             assert 'x' not in permissions['test1'].keys()
 
+    def test_fetch_permissions_cached(self, monkeypatch):
+        loader = Mock(return_value=['foo'])
+        monkeypatch.setattr(
+            graphene_field_permission.permissions_loader,
+            'get_permissions_method',
+            lambda: loader
+        )
+        cache = PermissionCache()
+        set_permissions_cache(cache)
+        try:
+            user = Mock(spec=['pk'], pk=1)
+            permissions = fetch_permissions(user)
+            assert fetch_permissions(user) is permissions
+            assert loader.call_count == 1
+
+            cache.invalidate(user)
+            assert 'foo' in fetch_permissions(user)
+            assert loader.call_count == 2
+        finally:
+            set_permissions_cache(None)
+
+        fetch_permissions(user)
+        assert loader.call_count == 3
+
+    def test_fetch_permissions_many(self, monkeypatch):
+        loader = Mock(return_value=['single'])
+        # user 3 is left out, so is loaded on its own
+        bulk_loader = Mock(side_effect=lambda users: {
+            user.pk: ['bulk-{}'.format(user.pk)]
+            for user in users if user.pk != 3
+        })
+        monkeypatch.setattr(
+            graphene_field_permission.permissions_loader,
+            'get_permissions_method',
+            lambda: loader
+        )
+        monkeypatch.setattr(
+            graphene_field_permission.permissions_loader,
+            'get_bulk_permissions_method',
+            lambda: bulk_loader
+        )
+        users = [Mock(spec=['pk'], pk=pk) for pk in (1, 2, 3, 4)]
+        cache = PermissionCache()
+        set_permissions_cache(cache)
+        try:
+            cache.set(users[3], restructure_permissions(['cached']))
+            results = fetch_permissions_many(users + [users[0]], batch_size=2)
+            assert [list(permissions) for permissions in results] == [
+                ['bulk-1'], ['bulk-2'], ['single'], ['cached'], ['bulk-1'],
+            ]
+            assert bulk_loader.call_count == 2
+            assert [user.pk for user in bulk_loader.call_args[0][0]] == [3]
+            assert loader.call_count == 1
+            # bulk results are cached
+            assert 'bulk-2' in fetch_permissions(users[1])
+            assert loader.call_count == 1
+        finally:
+            set_permissions_cache(None)
+
+        # without a bulk method every user is fetched on its own
+        monkeypatch.setattr(
+            graphene_field_permission.permissions_loader,
+            'get_bulk_permissions_method',
+            lambda: None
+        )
+        assert len(fetch_permissions_many(users)) == 4
+        assert loader.call_count == 5
+        assert fetch_permissions_many([]) == []
+
+    def test_check_field_access_many(self, monkeypatch):
+        calls = []
+
+        def counting_has_access(*required, user_permissions, filter_id=None):
+            calls.append(filter_id)
+            return _has_access(
+                *required,
+                user_permissions=user_permissions,
+                filter_id=filter_id
+            )
+
+        monkeypatch.setattr(
+            graphene_field_permission.api,
+            '_has_access',
+            counting_has_access
+        )
+        info_context = types.SimpleNamespace(
+            permissions=restructure_permissions(group_permission_data),
+            permission_decisions={},
+        )
+        items = [
+            Mock(group_id=group_id) for group_id in
+            ('group-1234', 'group-5678', 'group-1234', 'group-0000') * 10
+        ]
+        assert check_field_access_many(
+            items,
+            'permission1',
+            filter_field='group_id',
+            info_context=info_context
+        ) == [True, False, True, False] * 10
+        # one decision per distinct filter id
+        assert sorted(calls) == ['group-0000', 'group-1234', 'group-5678']
+
+        # per node checks reuse the primed filter ids and decisions
+        assert check_field_access(
+            'permission1',
+            filter_field='group_id',
+            filter_data=items[0],
+            info_context=info_context
+        )
+        assert len(calls) == 3
+
+        assert check_field_access_many(
+            items[:2],
+            'permission1',
+            info_context=types.SimpleNamespace(
+                permissions=restructure_permissions(['permission1']),
+            )
+        ) == [True, True]
+        assert check_field_access_many(
+            [],
+            'permission1',
+            filter_field='group_id',
+            info_context=info_context
+        ) == []
 
     def test_check_field_access_single(
             self,
@@ -173,6 +379,67 @@ class TestApi:
                 info_context=info_context_mock
             )
 
+    def test_check_field_access_memoized(
+            self,
+            group_permissions,
+            info_context_mock,
+            monkeypatch,
+    ):
+        has_access = Mock(wraps=_has_access)
+        monkeypatch.setattr(
+            graphene_field_permission.api,
+            '_has_access',
+            has_access
+        )
+        test_data = Mock()
+        test_data.group.id = 'group-1234'
+
+        for _ in range(3):
+            assert check_field_access(
+                'permission1',
+                filter_field='group.id',
+                filter_data=test_data,
+                info_context=info_context_mock,
+            ) is True
+        assert has_access.call_count == 1
+
+        denials = []
+        for _ in range(3):
+            with pytest.raises(PermissionError) as exc:
+                check_field_access(
+                    'permission4',
+                    filter_field='group.id',
+                    filter_data=test_data,
+                    info_context=info_context_mock,
+                )
+            denials.append(exc.value)
+        assert has_access.call_count == 2
+        # denials are cached rather than rebuilt
+        assert denials[0] is denials[1] is denials[2]
+
+        # a different filter id is a different decision
+        test_data.group.id = 'group-5678'
+        with pytest.raises(PermissionError):
+            check_field_access(
+                'permission1',
+                filter_field='group.id',
+                filter_data=test_data,
+                info_context=info_context_mock,
+            )
+        assert has_access.call_count == 3
+
+        # no permissions on the filter id at all is memoized too
+        test_data.group.id = 'group-0000'
+        for _ in range(3):
+            with pytest.raises(ValueError, match='group-0000'):
+                check_field_access(
+                    'permission1',
+                    filter_field='group.id',
+                    filter_data=test_data,
+                    info_context=info_context_mock,
+                )
+        assert has_access.call_count == 4
+
     def test_check_field_access_group(
             self,
             group_permissions,
@@ -197,3 +464,117 @@ class TestApi:
                 filter_field='group.division.corporation.id',
                 info_context=info_context_mock,
             )
+
+    def test_fetch_permissions_async_loader(self, monkeypatch):
+        async def permissions_method(user):
+            return ['foo']
+
+        monkeypatch.setattr(
+            graphene_field_permission.permissions_loader,
+            'get_permissions_method',
+            lambda: permissions_method
+        )
+        permissions = asyncio.run(fetch_permissions_async(Mock()))
+        assert 'foo' in permissions
+
+        # sync fetch can't run an async permissions method
+        with pytest.raises(TypeError):
+            fetch_permissions(Mock())
+
+    def test_fetch_permissions_async_sync_loader(self, single_permissions):
+        permissions = asyncio.run(fetch_permissions_async(Mock()))
+        assert 'permission1' in permissions
+
+    def test_fetch_permissions_single_flight(self, monkeypatch):
+        calls = []
+
+        async def permissions_method(user):
+            calls.append(user)
+            await asyncio.sleep(0.01)
+            return ['foo']
+
+        monkeypatch.setattr(
+            graphene_field_permission.permissions_loader,
+            'get_permissions_method',
+            lambda: permissions_method
+        )
+        user = Mock(pk=1)
+
+        async def fetch_concurrently():
+            return await asyncio.gather(*[
+                fetch_permissions_async(user) for _ in range(5)
+            ])
+
+        results = asyncio.run(fetch_concurrently())
+        assert len(calls) == 1
+        assert all(permissions is results[0] for permissions in results)
+
+        try:
+            set_single_flight(None)
+            asyncio.run(fetch_concurrently())
+            assert len(calls) == 6
+        finally:
+            set_single_flight(SingleFlight())
+
+    def test_check_field_access_async(self, monkeypatch):
+        calls = []
+
+        async def permissions_method(user):
+            calls.append(user)
+            await asyncio.sleep(0)
+            return group_permission_data
+
+        monkeypatch.setattr(
+            graphene_field_permission.permissions_loader,
+            'get_permissions_method',
+            lambda: permissions_method
+        )
+        info_context = Mock(spec=[])
+        info_context.user = Mock()
+        test_data = Mock()
+        test_data.group.id = 'group-1234'
+
+        async def resolve_concurrently():
+            return await asyncio.gather(*[
+                check_field_access_async(
+                    'permission1',
+                    filter_field='group.id',
+                    filter_data=test_data,
+                    info_context=info_context,
+                )
+                for _ in range(5)
+            ])
+
+        assert asyncio.run(resolve_concurrently()) == [True] * 5
+        # the concurrent checks shared one fetch
+        assert len(calls) == 1
+        assert 'permission1' in info_context.permissions['group-1234']
+
+        with pytest.raises(PermissionError):
+            asyncio.run(check_field_access_async(
+                'permission4',
+                filter_field='group.id',
+                filter_data=test_data,
+                info_context=info_context,
+            ))
+
+    def test_check_field_access_async_error(self, monkeypatch):
+        permissions_method = Mock(side_effect=[ValueError, ['permission1']])
+        monkeypatch.setattr(
+            graphene_field_permission.permissions_loader,
+            'get_permissions_method',
+            lambda: permissions_method
+        )
+        info_context = Mock(spec=[])
+        info_context.user = Mock()
+
+        with pytest.raises(ValueError):
+            asyncio.run(check_field_access_async(
+                'permission1',
+                info_context=info_context,
+            ))
+        # a failed fetch is retried by the next check
+        assert asyncio.run(check_field_access_async(
+            'permission1',
+            info_context=info_context,
+        )) is True
@@ -0,0 +1,164 @@
+import os
+import sys
+import pytest
+from unittest.mock import Mock
+from graphene_field_permission.backends import (
+    ClientBackend,
+    DjangoCacheBackend,
+    FileBackend,
+    LocalBackend,
+    MemoryClient,
+    SharedPermissionCache,
+)
+from graphene_field_permission.api import restructure_permissions
+from graphene_field_permission.lazy import LazyGroupPermissions
+from .fixtures import group_permission_data
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(params=['local', 'client', 'file'])
+def backend(request, clock, tmp_path):
+    if request.param == 'local':
+        return LocalBackend(clock=clock)
+    if request.param == 'client':
+        return ClientBackend(MemoryClient(clock=clock))
+    return FileBackend(directory=str(tmp_path), clock=clock)
+
+
+class TestBackends:
+    def test_backend(self, backend, clock):
+        assert backend.get('missing') is None
+        backend.set('key', b'value')
+        assert backend.get('key') == b'value'
+        backend.delete('key')
+        assert backend.get('key') is None
+        backend.delete('key')
+
+        backend.set('expiring', b'value', ttl=10)
+        assert backend.get('expiring') == b'value'
+        clock.now += 10
+        assert backend.get('expiring') is None
+
+    def test_django_backend(self, monkeypatch):
+        django_cache = Mock()
+        cache_module = Mock(spec=['caches'])
+        cache_module.caches = {'permissions': django_cache}
+        monkeypatch.setitem(sys.modules, 'django.core.cache', cache_module)
+
+        backend = DjangoCacheBackend('permissions')
+        backend.set('key', b'value', ttl=30)
+        django_cache.set.assert_called_once_with('key', b'value', timeout=30)
+        backend.get('key')
+        django_cache.get.assert_called_once_with('key')
+        backend.delete('key')
+        django_cache.delete.assert_called_once_with('key')
+
+    def test_client_backend_ttl_argument(self):
+        client = Mock()
+        ClientBackend(client, ttl_argument='expire').set('key', b'v', ttl=5)
+        client.set.assert_called_once_with('key', b'v', expire=5)
+
+    def test_shared_permission_cache(self, backend, clock):
+        # two workers sharing the backend
+        first = SharedPermissionCache(backend, ttl=60, clock=clock)
+        second = SharedPermissionCache(backend, ttl=60, clock=clock)
+        user = Mock(spec=['pk'], pk=1)
+        other = Mock(spec=['pk'], pk=2)
+        permissions = restructure_permissions(group_permission_data)
+
+        assert first.get(user) is None
+        first.set(user, permissions)
+        first.set(other, permissions)
+        assert second.get(user) == permissions
+
+        second.invalidate(user)
+        assert first.get(user) is None
+        assert first.get(other) == permissions
+
+        # unreadable entries are misses
+        backend.set(second._key(other), b'not permissions')
+        assert first.get(other) is None
+        first.set(other, permissions)
+
+        second.invalidate_all()
+        assert second.get(other) is None
+        # other workers see the new generation within generation_ttl
+        clock.now += first.generation_ttl
+        assert first.get(other) is None
+
+        # anonymous users and unshareable permissions aren't stored
+        anonymous = Mock(spec=['pk'], pk=None)
+        first.set(anonymous, permissions)
+        assert first.get(anonymous) is None
+        first.set(user, LazyGroupPermissions(user, Mock()))
+        assert first.get(user) is None
+
+    def test_generation_reads(self, clock):
+        backend = LocalBackend(clock=clock)
+        backend.get = Mock(wraps=backend.get)
+        cache = SharedPermissionCache(backend, clock=clock)
+        user = Mock(spec=['pk'], pk=1)
+        permissions = restructure_permissions(group_permission_data)
+
+        cache.set(user, permissions)
+        for _ in range(3):
+            assert cache.get(user) == permissions
+        # one generation read, then one read per get
+        assert backend.get.call_count == 4
+
+        clock.now += cache.generation_ttl
+        cache.get(user)
+        assert backend.get.call_count == 6
+
+    def test_file_backend_sweep(self, clock, tmp_path):
+        backend = FileBackend(directory=str(tmp_path), clock=clock)
+        cache = SharedPermissionCache(backend, ttl=600, clock=clock)
+        permissions = restructure_permissions(group_permission_data)
+        for pk in range(5):
+            cache.set(Mock(spec=['pk'], pk=pk), permissions)
+        backend.set('unrelated', b'value')
+        assert len(list(tmp_path.iterdir())) == 6
+
+        # old generation files are removed, not left until read again
+        cache.invalidate_all()
+        assert sorted(backend._read(str(path))[1] for path in
+                      tmp_path.iterdir()) == ['gfp:generation', 'unrelated']
+
+        # expired files are swept on write
+        backend.set('expiring', b'value', ttl=1)
+        clock.now += backend.sweep_interval
+        backend.set('key', b'value')
+        assert len(list(tmp_path.iterdir())) == 3
+        assert backend.get('expiring') is None
+        assert backend.sweep() == 0
+
+    def test_file_backend_directory(self, tmp_path, monkeypatch):
+        directory = tmp_path / 'cache'
+        FileBackend(directory=str(directory))
+        assert directory.stat().st_mode & 0o777 == 0o700
+
+        # others could plant permissions in these
+        directory.chmod(0o770)
+        with pytest.raises(PermissionError, match='writable'):
+            FileBackend(directory=str(directory))
+        directory.chmod(0o700)
+        link = tmp_path / 'link'
+        link.symlink_to(directory)
+        with pytest.raises(PermissionError, match='not a directory'):
+            FileBackend(directory=str(link))
+        owner = directory.stat().st_uid
+        monkeypatch.setattr(os, 'getuid', lambda: owner + 1)
+        with pytest.raises(PermissionError, match='another user'):
+            FileBackend(directory=str(directory))
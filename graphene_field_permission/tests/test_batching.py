@@ -0,0 +1,147 @@
+import asyncio
+import sys
+import threading
+import pytest
+from unittest.mock import Mock
+from graphene_field_permission import api
+from graphene_field_permission.api import check_field_access
+from graphene_field_permission.batching import (
+    FilterDataLoader,
+    get_filter_loader,
+    prime_filter_fields,
+    resolve_filter_ids,
+)
+from .fixtures import (
+    group_permissions,
+    info_context_mock,
+)
+
+
+def group_node(group_id):
+    node = Mock(spec=['group'])
+    node.group.division.id = group_id
+    return node
+
+
+class TestBatching:
+    def test_resolve_filter_ids(self):
+        nodes = [group_node('group-1234'), group_node('group-5678')]
+        assert resolve_filter_ids(nodes, 'group.division.id') == [
+            'group-1234',
+            'group-5678',
+        ]
+
+    def test_resolve_filter_ids_prefetch(self, monkeypatch):
+        models_mock = Mock(spec=['prefetch_related_objects'])
+        monkeypatch.setitem(sys.modules, 'django.db.models', models_mock)
+        nodes = [Mock(spec=['_meta', 'group']) for _ in range(3)]
+        for node in nodes:
+            node.group.division_id = 12
+
+        assert resolve_filter_ids(nodes, 'group.division_id') == ['12'] * 3
+        models_mock.prefetch_related_objects.assert_called_once_with(
+            nodes,
+            'group'
+        )
+
+        # single level paths don't need prefetching
+        models_mock.prefetch_related_objects.reset_mock()
+        resolve_filter_ids(nodes, 'group')
+        assert not models_mock.prefetch_related_objects.called
+
+        # paths that aren't relations fall back to lazy traversal
+        models_mock.prefetch_related_objects.side_effect = ValueError
+        assert resolve_filter_ids(nodes, 'group.division_id') == ['12'] * 3
+
+    def test_prime(self):
+        resolve_many = Mock(side_effect=resolve_filter_ids)
+        loader = FilterDataLoader(resolve_many=resolve_many)
+        nodes = [group_node('group-1234'), group_node('group-5678')]
+
+        loader.prime(nodes, 'group.division.id')
+        loader.prime(nodes, 'group.division.id')
+        assert resolve_many.call_count == 1
+        assert loader.get(nodes[0], 'group.division.id') == 'group-1234'
+        assert loader.get(nodes[1], 'group.division.id') == 'group-5678'
+        assert loader.get(nodes[0], 'group.id') is None
+
+    def test_load_batches(self):
+        resolve_many = Mock(side_effect=resolve_filter_ids)
+        loader = FilterDataLoader(resolve_many=resolve_many)
+        nodes = [group_node('group-{}'.format(i)) for i in range(5)]
+
+        async def load_all():
+            return await asyncio.gather(*[
+                loader.load(node, 'group.division.id')
+                for node in nodes + nodes
+            ])
+
+        filter_ids = asyncio.run(load_all())
+        assert filter_ids == ['group-{}'.format(i) for i in range(5)] * 2
+        # one bulk resolution for everything requested in the tick
+        assert resolve_many.call_count == 1
+        assert len(resolve_many.call_args[0][0]) == 5
+
+        # already resolved objects don't resolve again
+        asyncio.run(load_all())
+        assert resolve_many.call_count == 1
+
+    def test_load_off_loop(self):
+        threads = []
+
+        def resolve_many(objects, filter_field):
+            threads.append(threading.get_ident())
+            return resolve_filter_ids(objects, filter_field)
+
+        loader = FilterDataLoader(resolve_many=resolve_many)
+
+        async def load():
+            return await loader.load(
+                group_node('group-1234'),
+                'group.division.id'
+            )
+
+        assert asyncio.run(load()) == 'group-1234'
+        # blocking ORM work stays off the event loop's thread
+        assert threads and threads[0] != threading.get_ident()
+
+    def test_load_error(self):
+        loader = FilterDataLoader(resolve_many=Mock(side_effect=ValueError))
+
+        async def load():
+            return await loader.load(group_node('group-1234'), 'group.id')
+
+        with pytest.raises(ValueError):
+            asyncio.run(load())
+
+    def test_prime_filter_fields(
+            self,
+            group_permissions,
+            info_context_mock,
+            monkeypatch,
+    ):
+        nodes = [group_node('group-1234'), group_node('group-5678')]
+        assert prime_filter_fields(
+            info_context_mock,
+            iter(nodes),
+            'group.division.id'
+        ) == nodes
+        loader = get_filter_loader(info_context_mock)
+        assert get_filter_loader(info_context_mock) is loader
+
+        # primed filter ids are used instead of traversing each node
+        get_filter_data = Mock()
+        monkeypatch.setattr(api, 'get_filter_data', get_filter_data)
+        assert check_field_access(
+            'permission1',
+            filter_field='group.division.id',
+            filter_data=nodes[0],
+            info_context=info_context_mock,
+        ) is True
+        assert check_field_access(
+            'permission4',
+            filter_field=api.compile_filter_field('group.division.id'),
+            filter_data=nodes[1],
+            info_context=info_context_mock,
+        ) is True
+        assert not get_filter_data.called
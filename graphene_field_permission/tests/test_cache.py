@@ -0,0 +1,98 @@
+import pytest
+from unittest.mock import Mock
+from graphene_field_permission.cache import (
+    LRUCache,
+    PermissionCache,
+    estimate_size,
+    user_key,
+)
+from graphene_field_permission.engine import PermissionSet
+from .fixtures import (
+    single_permission_data,
+    structured_group_permission_data,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class TestCache:
+    def test_user_key(self):
+        assert user_key(Mock(spec=['pk'], pk=5)) == 5
+        assert user_key(Mock(spec=['id'], id=7)) == 7
+        assert user_key(Mock(spec=['pk', 'id'], pk=None, id=None)) is None
+
+    def test_estimate_size(self):
+        permissions = PermissionSet(single_permission_data)
+        assert estimate_size(permissions) > 0
+        assert estimate_size(structured_group_permission_data) > \
+            estimate_size({})
+
+    def test_lru_cache_ttl(self, clock):
+        cache = LRUCache(ttl=10, clock=clock)
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        clock.now = 10
+        assert cache.get('a') is None
+        assert len(cache) == 0
+
+    def test_lru_cache_max_entries(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        # touch 'a' so 'b' is least recently used
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_lru_cache_max_bytes(self):
+        cache = LRUCache(max_bytes=25, sizeof=lambda value: value)
+        cache.set('a', 10)
+        cache.set('b', 10)
+        assert cache.bytes == 20
+        cache.set('c', 10)
+        assert cache.get('a') is None
+        assert cache.bytes == 20
+        # too large to ever fit
+        cache.set('b', 30)
+        assert cache.get('b') is None
+        assert cache.bytes == 10
+
+        cache.delete('c')
+        assert cache.bytes == 0
+        cache.set('d', 5)
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.bytes == 0
+
+    def test_permission_cache(self, clock):
+        cache = PermissionCache(ttl=60, clock=clock)
+        user = Mock(spec=['pk'], pk=1)
+        other = Mock(spec=['pk'], pk=2)
+        anonymous = Mock(spec=['pk'], pk=None)
+        permissions = PermissionSet(single_permission_data)
+
+        cache.set(user, permissions)
+        cache.set(other, permissions)
+        cache.set(anonymous, permissions)
+        assert cache.get(user) is permissions
+        assert cache.get(anonymous) is None
+
+        cache.invalidate(user)
+        assert cache.get(user) is None
+        assert cache.get(other) is permissions
+
+        cache.invalidate_all()
+        assert cache.get(other) is None
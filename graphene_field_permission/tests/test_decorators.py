@@ -1,6 +1,14 @@
+import asyncio
+import inspect
+import threading
 import pytest
+from unittest.mock import Mock
 from graphene_field_permission import api
-from graphene_field_permission.decorators import has_field_access
+from graphene_field_permission.decorators import (
+    has_field_access,
+    ListAccessConnectionMixin,
+    has_list_access,
+)
 
 from .fixtures import (
     single_info,
@@ -47,6 +55,15 @@ class TestDecorators:
         assert 'permission5' in decorator3.req_perms
         assert decorator3.filter_field == 'division.corporation.id'
 
+    def test___init___compiles(self, decorator1, decorator3):
+        assert decorator1.requirement.permissions == ('permission1',)
+        assert decorator1.filter_path is None
+        assert decorator3.requirement.permissions == (
+            'permission4',
+            'permission5',
+        )
+        assert decorator3.filter_path.filter_field == 'division.corporation.id'
+
     def test___call__(self, single_info, group_info, orm_data_mock, monkeypatch):
         def patch_field_access(*requirements, info_context, filter_field, filter_data):
             return True
@@ -90,3 +107,308 @@ class TestDecorators:
 
             with pytest.raises(Exception):
                 resolve_testfield(orm_data_mock, group_info)
+
+    def test___call___compiled_arguments(self, orm_data_mock, group_info,
+                                         monkeypatch):
+        calls = []
+
+        def patch_field_access(*requirements, info_context, filter_field,
+                               filter_data):
+            calls.append((requirements, filter_field))
+            raise PermissionError
+
+        decorator = has_field_access(
+            'permission3',
+            filter_field='group.corporation.id'
+        )
+
+        @decorator
+        def resolve_group_name(test_data, info):
+            pass
+
+        monkeypatch.setattr(api, 'check_field_access', patch_field_access)
+        with pytest.raises(Exception, match="field 'group_name'") as exc1:
+            resolve_group_name(orm_data_mock, group_info)
+        with pytest.raises(Exception) as exc2:
+            resolve_group_name(orm_data_mock, group_info)
+        # each denial gets its own error, without the AccessDenied context
+        assert exc1.value is not exc2.value
+        assert exc1.value.__cause__ is None
+        assert exc1.value.__suppress_context__
+        assert calls[0] == ((decorator.requirement,), decorator.filter_path)
+
+    def test___call___soft_deny(self, orm_data_mock, group_info,
+                                monkeypatch):
+        def patch_field_access(*requirements, info_context, filter_field,
+                               filter_data):
+            raise PermissionError
+
+        monkeypatch.setattr(api, 'check_field_access', patch_field_access)
+        group_info.context.permission_denials = None
+        assert api.get_denial_error(group_info.context) is None
+        masked = object()
+
+        @has_field_access('permission3', soft_deny=True)
+        def resolve_group_name(test_data, info):
+            pass
+
+        @has_field_access('permission3', soft_deny=True, masked_value=masked)
+        def resolve_group_text(test_data, info):
+            pass
+
+        for _ in range(3):
+            assert resolve_group_name(orm_data_mock, group_info) is None
+        assert resolve_group_text(orm_data_mock, group_info) is masked
+
+        error = api.get_denial_error(group_info.context)
+        assert error.denials == {'group_name': 3, 'group_text': 1}
+        assert str(error) == (
+            'No access for user on 4 fields: group_name (3), group_text (1)'
+        )
+
+        # class level default
+        monkeypatch.setattr(has_field_access, 'soft_deny', True)
+
+        @has_field_access('permission3')
+        def resolve_group_description(test_data, info):
+            pass
+
+        assert resolve_group_description(orm_data_mock, group_info) is None
+
+        @has_field_access('permission3', soft_deny=False)
+        def resolve_group_description(test_data, info):
+            pass
+
+        with pytest.raises(Exception, match='group_description'):
+            resolve_group_description(orm_data_mock, group_info)
+
+    def test___call___soft_deny_filter(self, group_info, monkeypatch):
+        # no grant at all on the filter id
+        group_info.context.permissions = group_info.context.user_permissions
+        group_info.context.permission_decisions = {}
+        group_info.context.permission_denials = None
+        group_info.context.filter_loader = None
+        row = Mock(spec=['group_id'], group_id='group-0000')
+
+        @has_field_access('permission1', filter_field='group_id',
+                          soft_deny=True)
+        def resolve_group_name(test_data, info):
+            return 'name'
+
+        @has_field_access('permission1', filter_field='group_id',
+                          soft_deny=True)
+        async def resolve_group_text(test_data, info):
+            return 'text'
+
+        assert resolve_group_name(row, group_info) is None
+        assert asyncio.run(resolve_group_text(row, group_info)) is None
+        assert group_info.context.permission_denials == {
+            'group_name': 1,
+            'group_text': 1,
+        }
+
+        # without soft deny the error is raised as before
+        @has_field_access('permission1', filter_field='group_id')
+        def resolve_group_name(test_data, info):
+            return 'name'
+
+        with pytest.raises(ValueError, match='group-0000'):
+            resolve_group_name(row, group_info)
+
+    def test___call___async(self, orm_data_mock, group_info, monkeypatch):
+        async def patch_field_access(*requirements, info_context,
+                                     filter_field, filter_data):
+            return True
+
+        async def patch_field_access_fail(*requirements, info_context,
+                                          filter_field, filter_data):
+            raise PermissionError
+
+        @has_field_access('permission4', filter_field='group.corporation.id')
+        async def resolve_testfield(test_data, info):
+            return test_data.name
+
+        monkeypatch.setattr(
+            api,
+            'check_field_access_async',
+            patch_field_access
+        )
+        assert asyncio.run(
+            resolve_testfield(orm_data_mock, group_info)
+        ) == 'foobar'
+
+        monkeypatch.setattr(
+            api,
+            'check_field_access_async',
+            patch_field_access_fail
+        )
+        with pytest.raises(Exception, match="field 'testfield'"):
+            asyncio.run(resolve_testfield(orm_data_mock, group_info))
+
+    def test_has_list_access(self, group_info, monkeypatch):
+        calls = []
+
+        def patch_field_access_many(rows, *requirements, filter_field,
+                                    info_context):
+            calls.append((requirements, filter_field))
+            return [row % 2 == 0 for row in rows]
+
+        monkeypatch.setattr(
+            api,
+            'check_field_access_many',
+            patch_field_access_many
+        )
+        decorator = has_list_access('permission1', filter_field='group_id')
+
+        @decorator
+        def resolve_groups(root, info):
+            return iter(range(5))
+
+        assert resolve_groups(None, group_info) == [0, 2, 4]
+        assert calls == [((decorator.requirement,), 'group_id')]
+
+        @has_list_access('permission1', mask=True, masked_value='-')
+        def resolve_groups(root, info):
+            return range(5)
+
+        assert resolve_groups(None, group_info) == [0, '-', 2, '-', 4]
+
+        async def patch_permissions_async(info_context):
+            return info_context.user_permissions
+
+        monkeypatch.setattr(
+            api,
+            'get_context_permissions_async',
+            patch_permissions_async
+        )
+
+        threads = []
+
+        def patch_field_access_many(rows, *requirements, filter_field,
+                                    info_context):
+            # rows are evaluated and checked off the event loop
+            threads.append(threading.get_ident())
+            return [row % 2 == 0 for row in rows]
+
+        monkeypatch.setattr(
+            api,
+            'check_field_access_many',
+            patch_field_access_many
+        )
+
+        @has_list_access('permission1')
+        async def resolve_groups(root, info):
+            return range(4)
+
+        assert asyncio.run(resolve_groups(None, group_info)) == [0, 2]
+        assert threads and threads[0] != threading.get_ident()
+
+    def test_has_list_access_page(self, group_info, monkeypatch):
+        monkeypatch.setattr(
+            api,
+            'check_field_access_many',
+            lambda rows, *requirements, filter_field, info_context: [
+                row % 2 == 0 for row in rows
+            ]
+        )
+
+        class QuerySet(list):
+            query = Mock(is_sliced=False)
+
+        # querysets of plain list fields are evaluated as before
+        @has_list_access('permission1')
+        def resolve_groups(root, info):
+            return QuerySet(range(5))
+
+        assert resolve_groups(None, group_info) == [0, 2, 4]
+
+        # paginated connections have their edges checked
+        connection = Mock(spec=['edges', 'page_info'])
+        connection.edges = [Mock(spec=['node'], node=i) for i in range(4)]
+
+        @has_list_access('permission1')
+        def resolve_groups(root, info):
+            return connection
+
+        assert resolve_groups(None, group_info) is connection
+        assert [edge.node for edge in connection.edges] == [0, 2]
+
+        connection.edges = [Mock(spec=['node'], node=i) for i in range(3)]
+
+        @has_list_access('permission1', mask=True, masked_value='-')
+        def resolve_groups(root, info):
+            return connection
+
+        resolve_groups(None, group_info)
+        assert [edge.node for edge in connection.edges] == [0, '-', 2]
+
+    def test_list_access_connection_mixin(self, group_info, monkeypatch):
+        checked = []
+
+        def patch_field_access_many(rows, *requirements, filter_field,
+                                    info_context):
+            checked.append(list(rows))
+            return [row % 2 == 0 for row in rows]
+
+        monkeypatch.setattr(
+            api,
+            'check_field_access_many',
+            patch_field_access_many
+        )
+
+        class ConnectionField:
+            # stands in for DjangoConnectionField paginating the queryset
+            def wrap_resolve(self, parent_resolver):
+                def resolve(root, info, first):
+                    rows = parent_resolver(root, info)
+                    if inspect.isawaitable(rows):
+                        async def page():
+                            return paginate(await rows, first)
+                        return page()
+                    return paginate(rows, first)
+                return resolve
+
+        def paginate(rows, first):
+            connection = Mock(spec=['edges'])
+            connection.edges = [
+                Mock(spec=['node'], node=row) for row in rows[:first]
+            ]
+            return connection
+
+        class CheckedConnectionField(ListAccessConnectionMixin,
+                                     ConnectionField):
+            pass
+
+        @has_list_access('permission1')
+        def resolve_groups(root, info):
+            return list(range(100))
+
+        resolve = CheckedConnectionField().wrap_resolve(resolve_groups)
+        connection = resolve(None, group_info, first=4)
+        # only the page is checked
+        assert checked == [[0, 1, 2, 3]]
+        assert [edge.node for edge in connection.edges] == [0, 2]
+
+        async def patch_permissions_async(info_context):
+            return info_context.user_permissions
+
+        monkeypatch.setattr(
+            api,
+            'get_context_permissions_async',
+            patch_permissions_async
+        )
+
+        @has_list_access('permission1', mask=True, masked_value='-')
+        async def resolve_groups(root, info):
+            return list(range(100))
+
+        resolve = CheckedConnectionField().wrap_resolve(resolve_groups)
+        connection = asyncio.run(resolve(None, group_info, first=3))
+        assert [edge.node for edge in connection.edges] == [0, '-', 2]
+
+        # undecorated resolvers are left alone
+        def resolve_divisions(root, info):
+            return [1, 2, 3]
+
+        resolve = CheckedConnectionField().wrap_resolve(resolve_divisions)
+        assert len(resolve(None, group_info, first=2).edges) == 2
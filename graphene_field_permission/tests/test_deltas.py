@@ -0,0 +1,116 @@
+import pytest
+from unittest.mock import Mock
+from graphene_field_permission import api, versions
+from graphene_field_permission.api import restructure_permissions
+from graphene_field_permission.cache import PermissionCache
+from graphene_field_permission.deltas import (
+    DeltaQueue,
+    apply_delta,
+    apply_permissions_delta,
+)
+from graphene_field_permission.lazy import LazyGroupPermissions
+from .fixtures import (
+    group_permission_data,
+    single_permission_data,
+)
+
+
+@pytest.fixture
+def permissions_cache(monkeypatch):
+    cache = PermissionCache()
+    monkeypatch.setattr(api, 'permissions_cache', cache)
+    return cache
+
+
+class TestDeltas:
+    def test_apply_permissions_delta(self):
+        single = restructure_permissions(single_permission_data)
+        updated = apply_permissions_delta(
+            single,
+            grant=['permission9'],
+            revoke=['permission1', 'permission9x'],
+        )
+        assert sorted(updated) == ['permission2', 'permission3', 'permission9']
+        # the original is untouched
+        assert 'permission1' in single
+        with pytest.raises(ValueError):
+            apply_permissions_delta(single, grant=['a'], group='group-1234')
+
+        grouped = restructure_permissions(group_permission_data)
+        updated = apply_permissions_delta(
+            grouped,
+            grant=['permission7'],
+            group='group-9999',
+        )
+        assert list(updated['group-9999']) == ['permission7']
+        assert updated['group-1234'] is grouped['group-1234']
+        assert 'group-9999' not in grouped
+
+        # every group, emptied groups are dropped
+        updated = apply_permissions_delta(
+            grouped,
+            revoke=['permission1', 'permission2', 'permission3'],
+        )
+        assert list(updated) == ['group-5678']
+
+        lazy = LazyGroupPermissions(Mock(), Mock())
+        assert apply_permissions_delta(lazy, grant=['a']) is None
+
+    def test_apply_delta(self, permissions_cache):
+        user = Mock(spec=['pk'], pk='deltas-user')
+        permissions_cache.set(
+            user,
+            restructure_permissions(group_permission_data)
+        )
+        version = versions.get_version(user)
+
+        updated = apply_delta(user, revoke=['permission4'], group='group-5678')
+        assert 'permission4' not in updated['group-5678']
+        assert permissions_cache.get(user) is updated
+        assert versions.get_version(user) != version
+
+        # by primary key
+        apply_delta('deltas-user', grant=['permission4'], group='group-5678')
+        assert 'permission4' in permissions_cache.get(user)['group-5678']
+
+        # not cached, only invalidated
+        other = Mock(spec=['pk'], pk='deltas-other')
+        version = versions.get_version(other)
+        assert apply_delta(other, grant=['permission1']) is None
+        assert permissions_cache.get(other) is None
+        assert versions.get_version(other) != version
+
+    def test_apply_delta_no_cache(self, monkeypatch):
+        monkeypatch.setattr(api, 'permissions_cache', None)
+        user = Mock(spec=['pk'], pk='deltas-user')
+        version = versions.get_version(user)
+        assert apply_delta(user, grant=['permission1']) is None
+        assert versions.get_version(user) != version
+
+    def test_delta_queue(self, permissions_cache):
+        user = Mock(spec=['pk'], pk='deltas-queue-user')
+        permissions_cache.set(
+            user,
+            restructure_permissions(single_permission_data)
+        )
+        deltas = DeltaQueue()
+        deltas.put(user, grant=['permission4'])
+        # a bad delta is reported and the user reloaded instead
+        deltas.put(user, grant=['permission5'], group='group-1234')
+        deltas.put(user, revoke=['permission1'])
+        assert len(deltas) == 3
+        assert deltas.drain() == 3
+        assert len(deltas) == 0
+        assert permissions_cache.get(user) is None
+
+        permissions_cache.set(
+            user,
+            restructure_permissions(single_permission_data)
+        )
+        deltas.start()
+        deltas.put(user, grant=['permission4'])
+        deltas.put(user, revoke=['permission1'])
+        deltas.stop(timeout=5)
+        assert sorted(permissions_cache.get(user)) == [
+            'permission2', 'permission3', 'permission4',
+        ]
@@ -0,0 +1,74 @@
+import pytest
+from graphene_field_permission import engine
+from graphene_field_permission.engine import (
+    PermissionSet,
+    Requirement,
+    compile_mask,
+    compile_requirement,
+    fingerprint,
+    intern,
+    mask_of,
+)
+from .fixtures import (
+    single_permission_data,
+    structured_single_permission_data,
+)
+
+
+class TestEngine:
+    def test_intern(self):
+        first = intern('engine-permission-a')
+        assert intern('engine-permission-a') == first
+        assert intern('engine-permission-b') != first
+
+    def test_compile_mask(self):
+        mask = compile_mask(['engine-permission-a', 'engine-permission-b'])
+        assert mask & (1 << intern('engine-permission-a'))
+        assert mask & (1 << intern('engine-permission-b'))
+        assert compile_mask([]) == 0
+
+    def test_permission_set(self):
+        permissions = PermissionSet(single_permission_data)
+        assert permissions['permission1'] is True
+        assert 'permission2' in permissions
+        assert 'permission4' not in permissions
+        assert 'never-interned-permission' not in permissions
+        assert len(permissions) == 3
+        assert set(permissions) == set(single_permission_data)
+        assert permissions == structured_single_permission_data
+        assert permissions == PermissionSet(reversed(single_permission_data))
+        with pytest.raises(KeyError):
+            permissions['permission4']
+
+    def test_compile_requirement(self):
+        requirement = compile_requirement('Permission1', 'permission2')
+        assert isinstance(requirement, Requirement)
+        assert requirement.permissions == ('permission1', 'permission2')
+        assert compile_requirement('Permission1', 'permission2') is requirement
+        assert compile_requirement(requirement) is requirement
+
+        permissions = PermissionSet(single_permission_data)
+        assert requirement.mask & permissions.mask
+        assert not compile_requirement('permission4').mask & permissions.mask
+
+    def test_mask_of(self):
+        permissions = PermissionSet(single_permission_data)
+        assert mask_of(permissions) == permissions.mask
+        assert mask_of(structured_single_permission_data) == permissions.mask
+
+        # lookups don't intern, e.g. the group ids of grouped dicts
+        table_size = len(engine._ids)
+        grouped = {'engine-group-{}'.format(i): {} for i in range(100)}
+        assert mask_of(grouped) == 0
+        assert mask_of({'permission1': True, 'engine-unknown': True}) == \
+            mask_of(PermissionSet(['permission1']))
+        assert len(engine._ids) == table_size
+
+    def test_fingerprint(self):
+        grouped = {'engine-group-{}'.format(i): {} for i in range(1000)}
+        assert fingerprint(grouped) == 0
+        # a group id that names a permission counts, as it does for checks
+        grouped['permission1'] = {}
+        assert fingerprint(grouped) == mask_of(PermissionSet(['permission1']))
+        assert fingerprint(PermissionSet(['permission2'])) == \
+            mask_of(PermissionSet(['permission2']))
@@ -0,0 +1,34 @@
+import asyncio
+import sys
+import threading
+from unittest.mock import Mock
+from graphene_field_permission.executors import run_sync
+
+
+class TestExecutors:
+    def test_run_sync_executor(self, monkeypatch):
+        # without asgiref, e.g. outside Django
+        monkeypatch.setitem(sys.modules, 'asgiref.sync', None)
+
+        def blocking(value):
+            return value, threading.get_ident()
+
+        value, thread = asyncio.run(run_sync(blocking, 'value'))
+        assert value == 'value'
+        assert thread != threading.get_ident()
+
+    def test_run_sync_asgiref(self, monkeypatch):
+        async def wrapped(*args):
+            return args
+
+        sync_mock = Mock(spec=['sync_to_async'])
+        sync_mock.sync_to_async = Mock(return_value=wrapped)
+        monkeypatch.setitem(sys.modules, 'asgiref.sync', sync_mock)
+        blocking = Mock()
+
+        assert asyncio.run(run_sync(blocking, 1, 2)) == (1, 2)
+        # Django's thread, where its connections are cleaned up
+        sync_mock.sync_to_async.assert_called_once_with(
+            blocking,
+            thread_sensitive=True
+        )
@@ -0,0 +1,89 @@
+import pytest
+from unittest.mock import Mock
+from graphene_field_permission import api
+from graphene_field_permission.api import (
+    check_field_access,
+    restructure_permissions,
+)
+from graphene_field_permission.cache import LRUCache
+from graphene_field_permission.lazy import LazyGroupPermissions
+from .fixtures import (
+    group_permission_data,
+    info_context_mock,
+)
+
+
+def load_group(user, group_id):
+    return group_permission_data.get(group_id)
+
+
+class TestLazy:
+    def test_lazy_group_permissions(self):
+        loader = Mock(side_effect=load_group)
+        permissions = LazyGroupPermissions(Mock(), loader)
+        assert len(permissions) == 0
+
+        assert 'permission1' in permissions['group-1234']
+        assert 'permission4' not in permissions['group-1234']
+        assert 'permission4' in permissions['group-5678']
+        permissions['group-1234']
+        assert loader.call_count == 2
+
+        # groups without permissions raise KeyError and aren't reloaded
+        with pytest.raises(KeyError):
+            permissions['group-NONE']
+        assert 'group-NONE' not in permissions
+        assert loader.call_count == 3
+
+        assert set(permissions) == {'group-1234', 'group-5678'}
+        assert len(permissions) == 2
+
+    def test_shared_cache(self):
+        cache = LRUCache()
+        user = Mock(spec=['pk'], pk='lazy-user')
+        loader = Mock(side_effect=load_group)
+
+        first = LazyGroupPermissions(user, loader, cache=cache)
+        assert 'permission1' in first['group-1234']
+        with pytest.raises(KeyError):
+            first['group-NONE']
+
+        # a later request's instance reuses the groups already loaded
+        second = LazyGroupPermissions(user, loader, cache=cache)
+        assert 'permission1' in second['group-1234']
+        with pytest.raises(KeyError):
+            second['group-NONE']
+        assert loader.call_count == 2
+
+    def test_check_field_access(self, info_context_mock, monkeypatch):
+        loader = Mock(side_effect=load_group)
+        permissions_method = Mock(
+            side_effect=lambda user: LazyGroupPermissions(user, loader)
+        )
+        monkeypatch.setattr(
+            api.permissions_loader,
+            'get_permissions_method',
+            lambda: permissions_method
+        )
+        permissions = LazyGroupPermissions(Mock(), loader)
+        assert restructure_permissions(permissions) is permissions
+
+        test_data = Mock()
+        test_data.group.id = 'group-5678'
+        assert check_field_access(
+            'permission4',
+            filter_field='group.id',
+            filter_data=test_data,
+            info_context=info_context_mock,
+        ) is True
+        assert loader.call_count == 1
+        loader.assert_called_once_with(info_context_mock.user, 'group-5678')
+
+        test_data.group.id = 'group-NONE'
+        with pytest.raises(ValueError):
+            check_field_access(
+                'permission4',
+                filter_field='group.id',
+                filter_data=test_data,
+                info_context=info_context_mock,
+            )
@@ -0,0 +1,137 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock
+from graphene_field_permission import api, metrics
+from graphene_field_permission.cache import PermissionCache
+from graphene_field_permission.decorators import has_field_access
+from graphene_field_permission.metrics import (
+    InMemorySink,
+    MetricsSink,
+    set_sink,
+)
+from graphene_field_permission.permissions import PermissionsMiddleware
+from .fixtures import (
+    single_permissions,
+    info_context_mock,
+)
+
+
+@pytest.fixture
+def sink():
+    sink = InMemorySink()
+    set_sink(sink)
+    yield sink
+    set_sink(None)
+
+
+class TestMetrics:
+    def test_set_sink(self):
+        assert metrics.enabled is False
+        sink = InMemorySink()
+        set_sink(sink)
+        assert metrics.enabled is True
+        assert metrics.sink is sink
+        set_sink(None)
+        assert metrics.enabled is False
+        assert isinstance(metrics.sink, MetricsSink)
+
+    def test_custom_sink(self):
+        class StatsdSink(MetricsSink):
+            def __init__(self):
+                self.calls = []
+
+            def increment(self, name, value=1, tags=None):
+                self.calls.append(name)
+
+        sink = StatsdSink()
+        set_sink(sink)
+        try:
+            assert metrics.enabled is True
+            metrics.increment('checks')
+            assert sink.calls == ['checks']
+        finally:
+            set_sink(None)
+        assert metrics.enabled is False
+
+    def test_in_memory_sink(self):
+        sink = InMemorySink()
+        sink.increment('checks')
+        sink.increment('checks', 2)
+        sink.increment('checks', tags={'field': 'name'})
+        sink.observe('seconds', 0.002)
+        sink.observe('seconds', 5)
+
+        assert sink.counter('checks') == 3
+        assert sink.counter('checks', field='name') == 1
+        histogram = sink.histogram('seconds')
+        assert histogram.count == 2
+        assert histogram.sum == 5.002
+        assert histogram.as_dict()['buckets'][0.005] == 1
+        assert histogram.as_dict()['buckets']['+Inf'] == 1
+
+        snapshot = sink.snapshot()
+        assert {'name': 'checks', 'tags': {'field': 'name'}, 'value': 1} in \
+            snapshot['counters']
+        assert snapshot['histograms'][0]['name'] == 'seconds'
+
+        sink.reset()
+        assert sink.counter('checks') == 0
+
+    def test_check_field_access(self, sink, single_permissions,
+                                info_context_mock):
+        api.check_field_access('permission1', info_context=info_context_mock)
+        api.check_field_access('permission1', info_context=info_context_mock)
+        with pytest.raises(PermissionError):
+            api.check_field_access('fail', info_context=info_context_mock)
+
+        assert sink.counter('check_field_access.checks') == 3
+        assert sink.counter('check_field_access.memo_hits') == 1
+        assert sink.counter('check_field_access.denied') == 1
+        assert sink.histogram('check_field_access.seconds').count == 3
+        assert sink.histogram('fetch_permissions.loader_seconds').count == 1
+
+    def test_fetch_permissions_cache(self, sink, single_permissions,
+                                     monkeypatch):
+        monkeypatch.setattr(api, 'permissions_cache', PermissionCache())
+        user = Mock(spec=['pk'], pk='metrics-user')
+        api.fetch_permissions(user)
+        api.fetch_permissions(user)
+        assert sink.counter('fetch_permissions.cache_misses') == 1
+        assert sink.counter('fetch_permissions.cache_hits') == 1
+
+    def test_has_field_access(self, sink, monkeypatch):
+        @has_field_access('permission1')
+        def resolve_name(data, info):
+            return 'name'
+
+        info = SimpleNamespace(context=SimpleNamespace())
+        monkeypatch.setattr(api, 'check_field_access', Mock())
+        resolve_name(None, info)
+        monkeypatch.setattr(
+            api,
+            'check_field_access',
+            Mock(side_effect=PermissionError)
+        )
+        with pytest.raises(Exception):
+            resolve_name(None, info)
+
+        field = resolve_name.__qualname__
+        assert sink.counter('field_access.checks', field=field) == 2
+        assert sink.counter('field_access.denied', field=field) == 1
+        assert sink.histogram('field_access.seconds', field=field).count == 2
+
+    def test_middleware(self, sink, monkeypatch):
+        monkeypatch.setattr(api, 'fetch_permissions', Mock(return_value={}))
+        class CachingPermissionsMiddleware(PermissionsMiddleware):
+            cache_ttl = 300
+
+        pm = CachingPermissionsMiddleware()
+        for _ in range(2):
+            info = Mock(spec=['context'])
+            info.context = Mock(spec=['user'])
+            info.context.user = Mock(spec=['id', 'pk'], id=1, pk=1)
+            pm.resolve(Mock(), None, info)
+
+        assert sink.counter('middleware.cache_misses') == 1
+        assert sink.counter('middleware.cache_hits') == 1
+        assert sink.histogram('middleware.fetch_seconds').count == 1
@@ -1,13 +1,17 @@
 import importlib
 import pytest
 import sys
+import graphene_field_permission.permissions_loader
 from unittest import mock
 from unittest.mock import Mock
 
+from graphene_field_permission import api, versions
+from graphene_field_permission.permissions import PermissionsMiddleware
 from .fixtures import (
     django_empty_conf,
     django_valid_conf,
     logger,
+    permissions_loader_reset,
     single_permission_data,
     group_permission_data,
 )
@@ -23,11 +27,13 @@ class TestPermissionsMiddleware:
             pm.on_error('this is an error')
             mock_error.assert_called_once_with('this is an error')
 
-    def test_resolve(self, django_valid_conf):
+    def test_resolve(self, django_valid_conf, permissions_loader_reset):
         next = Mock()
         root = Mock()
         info = Mock()
+        info.context = Mock(spec=['user'])
         info.context.user.id = 1
+        info.context.user.pk = 1
         # del sys.modules['django.conf']
         sys.modules['django.conf'] = django_valid_conf
 
@@ -41,30 +47,90 @@ class TestPermissionsMiddleware:
         pm = graphene_field_permission.permissions.PermissionsMiddleware()
         pm.resolve(next, root, info)
 
-        assert 'permission1' in pm.permissions
-        assert 'permission2' in pm.permissions
-        assert 'permission3' in pm.permissions
+        permissions = info.context.permissions
+        assert info.context.user_permissions is permissions
+        assert 'permission1' in permissions
+        assert 'permission2' in permissions
+        assert 'permission3' in permissions
         # run twice and check permissions remain set
         pm.resolve(next, root, info)
-        assert 'permission1' in pm.permissions
-        assert 'permission2' in pm.permissions
-        assert 'permission3' in pm.permissions
+        assert info.context.permissions is permissions
+        assert fakemod.fakemethod.call_count == 1
 
         # test grouped user
         fakemod = Mock(spec=[])
         fakemod.fakemethod = Mock(return_value=group_permission_data)
         sys.modules['fakemod'] = fakemod
+        graphene_field_permission.permissions_loader.reset()
 
         import graphene_field_permission.permissions
         importlib.reload(graphene_field_permission.permissions)
         pm = graphene_field_permission.permissions.PermissionsMiddleware()
+        info.context = Mock(spec=['user'])
+        info.context.user.id = 1
+        info.context.user.pk = 1
         pm.resolve(next, root, info)
 
-        assert 'permission1' in pm.permissions['group-1234']
-        assert 'permission2' in pm.permissions['group-1234']
-        assert 'permission4' not in pm.permissions['group-1234']
+        permissions = info.context.permissions
+        assert 'permission1' in permissions['group-1234']
+        assert 'permission2' in permissions['group-1234']
+        assert 'permission4' not in permissions['group-1234']
         # run twice and check permissions remain set
         pm.resolve(next, root, info)
-        assert 'permission4' in pm.permissions['group-5678']
-        assert 'permission5' in pm.permissions['group-5678']
-        assert 'permission3' not in pm.permissions['group-5678']
+        permissions = info.context.permissions
+        assert 'permission4' in permissions['group-5678']
+        assert 'permission5' in permissions['group-5678']
+        assert 'permission3' not in permissions['group-5678']
+
+    def test_resolve_per_user(self, monkeypatch):
+        next = Mock()
+        fetch_permissions = Mock(
+            side_effect=lambda user: {'user-{}'.format(user.pk): True}
+        )
+        monkeypatch.setattr(api, 'fetch_permissions', fetch_permissions)
+
+        def request_info(user_id):
+            info = Mock(spec=['context'])
+            info.context = Mock(spec=['user'])
+            info.context.user = Mock(spec=['id', 'pk'], id=user_id, pk=user_id)
+            return info
+
+        # only per request by default
+        pm = PermissionsMiddleware()
+        pm.resolve(next, None, request_info(1))
+        pm.resolve(next, None, request_info(1))
+        assert fetch_permissions.call_count == 2
+        fetch_permissions.reset_mock()
+
+        class CachingPermissionsMiddleware(PermissionsMiddleware):
+            cache_ttl = 300
+
+        pm = CachingPermissionsMiddleware()
+        first = request_info(1)
+        pm.resolve(next, None, first)
+        second = request_info(2)
+        pm.resolve(next, None, second)
+        assert 'user-1' in first.context.permissions
+        assert 'user-2' in second.context.permissions
+
+        # a later request from the same user reuses the cached permissions
+        again = request_info(1)
+        pm.resolve(next, None, again)
+        assert again.context.permissions is first.context.permissions
+        assert fetch_permissions.call_count == 2
+
+        # bumping the version only reloads that user
+        versions.bump_version(first.context.user)
+        pm.resolve(next, None, request_info(1))
+        pm.resolve(next, None, request_info(2))
+        assert fetch_permissions.call_count == 3
+
+        versions.bump_all()
+        pm.resolve(next, None, request_info(2))
+        assert fetch_permissions.call_count == 4
+
+        # anonymous users are never loaded
+        anonymous = request_info(None)
+        pm.resolve(next, None, anonymous)
+        assert not hasattr(anonymous.context, 'permissions')
+        assert fetch_permissions.call_count == 4
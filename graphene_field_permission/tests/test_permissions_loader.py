@@ -7,12 +7,20 @@ from .fixtures import (
     django_missing_src_method_conf,
     django_missing_src_module_conf,
     django_valid_conf,
+    permissions_loader_reset,
     user_permission_single_mock,
 )
 from graphene_field_permission.permissions_loader import (
     import_django_settings,
     import_settings,
-    get_permissions_method
+    get_permissions_method,
+    get_bulk_permissions_method,
+    configure,
+    is_configured,
+    reset,
+    DictSettings,
+    EnvironSettings,
+    SettingsProvider,
 )
 
 
@@ -74,7 +82,8 @@ def test_get_permissions_method(
         django_missing_src_module_conf,
         django_missing_src_method_conf,
         django_valid_conf,
-        user_permission_single_mock
+        user_permission_single_mock,
+        permissions_loader_reset,
 ):
     # missing django.conf should throw an exception
     if 'django.conf' in sys.modules:
@@ -118,3 +127,174 @@ def test_get_permissions_method(
     assert 'permission1' in permission_list
     assert 'permission2' in permission_list
     assert 'permission3' in permission_list
+
+
+def test_get_permissions_method_cached(
+        django_valid_conf,
+        user_permission_single_mock,
+        permissions_loader_reset,
+        monkeypatch,
+):
+    monkeypatch.setitem(sys.modules, 'django.conf', django_valid_conf)
+    fakemod = Mock(spec=[])
+    fakemod.fakemethod = Mock(return_value=user_permission_single_mock)
+    monkeypatch.setitem(sys.modules, 'fakemod', fakemod)
+
+    permissions_method = get_permissions_method()
+    assert permissions_method is fakemod.fakemethod
+
+    # settings are no longer read once resolved
+    monkeypatch.delitem(sys.modules, 'django.conf')
+    assert get_permissions_method() is permissions_method
+
+    # reset forces resolution from settings again
+    reset()
+    with pytest.raises(Exception):
+        get_permissions_method()
+
+
+def test_configure(
+        django_valid_conf,
+        permissions_loader_reset,
+        monkeypatch,
+):
+    def permissions_method(user):
+        return []
+
+    assert configure(permissions_method) is permissions_method
+    assert get_permissions_method() is permissions_method
+
+    # resolving from settings validates the method exists
+    monkeypatch.setitem(sys.modules, 'django.conf', django_valid_conf)
+    monkeypatch.setitem(sys.modules, 'fakemod', Mock(spec=[]))
+    with pytest.raises(Exception, match='fakemethod not found'):
+        configure()
+    # a failed configure leaves the previous method in place
+    assert get_permissions_method() is permissions_method
+
+
+def test_get_bulk_permissions_method(
+        django_valid_conf,
+        permissions_loader_reset,
+        monkeypatch,
+):
+    # not configured
+    monkeypatch.setitem(sys.modules, 'django.conf', django_valid_conf)
+    assert get_bulk_permissions_method() is None
+
+    reset()
+    settings = django_valid_conf.settings.GRAPHENE_FIELD_PERMISSION
+    monkeypatch.setitem(settings, 'SRC_BULK_METHOD', 'fakebulkmethod')
+    fakemod = Mock(spec=[])
+    fakemod.fakemethod = Mock()
+    fakemod.fakebulkmethod = Mock()
+    monkeypatch.setitem(sys.modules, 'fakemod', fakemod)
+    assert get_bulk_permissions_method() is fakemod.fakebulkmethod
+    configure()
+    assert get_bulk_permissions_method() is fakemod.fakebulkmethod
+
+    # missing method
+    reset()
+    monkeypatch.setitem(settings, 'SRC_BULK_METHOD', 'missing')
+    with pytest.raises(Exception):
+        get_bulk_permissions_method()
+
+    # set directly
+    bulk_method = Mock()
+    configure(Mock(), bulk_method)
+    assert get_bulk_permissions_method() is bulk_method
+    configure(Mock())
+    assert get_bulk_permissions_method() is None
+
+
+def test_configure_without_django(
+        user_permission_single_mock,
+        permissions_loader_reset,
+        monkeypatch,
+):
+    # django.conf is never imported
+    monkeypatch.setitem(sys.modules, 'django.conf', None)
+    with pytest.raises(Exception):
+        get_permissions_method()
+
+    loader = Mock(return_value=user_permission_single_mock)
+    configure(loader=loader)
+    assert get_permissions_method() is loader
+    assert get_bulk_permissions_method() is None
+
+    fakemod = Mock(spec=[])
+    fakemod.fakemethod = Mock()
+    fakemod.fakebulkmethod = Mock()
+    monkeypatch.setitem(sys.modules, 'fakemod', fakemod)
+    configure(options={
+        'SRC_MODULE': 'fakemod',
+        'SRC_METHOD': 'fakemethod',
+        'SRC_BULK_METHOD': 'fakebulkmethod',
+    })
+    assert get_permissions_method() is fakemod.fakemethod
+    assert get_bulk_permissions_method() is fakemod.fakebulkmethod
+    # the provider is kept until reset
+    reset()
+    with pytest.raises(Exception):
+        get_permissions_method()
+
+    class FlaskSettings(SettingsProvider):
+        def get_options(self):
+            return {'SRC_MODULE': 'fakemod', 'SRC_METHOD': 'fakemethod'}
+
+    configure(settings=FlaskSettings())
+    assert get_permissions_method() is fakemod.fakemethod
+
+    with pytest.raises(Exception, match='GRAPHENE_FIELD_PERMISSION values'):
+        configure(options={'SRC_MODULE': 'fakemod'})
+    # the bad options aren't kept, later resolution reads the provider
+    # that was configured before
+    assert get_permissions_method() is fakemod.fakemethod
+    with pytest.raises(Exception, match='fakemissing not found'):
+        configure(options={
+            'SRC_MODULE': 'fakemod',
+            'SRC_METHOD': 'fakemissing',
+        })
+    assert configure() is fakemod.fakemethod
+
+
+def test_app_ready(permissions_loader_reset, monkeypatch):
+    apps_mock = Mock(spec=['AppConfig'])
+    apps_mock.AppConfig = object
+    monkeypatch.setitem(sys.modules, 'django.apps', apps_mock)
+    monkeypatch.delitem(
+        sys.modules,
+        'graphene_field_permission.apps',
+        raising=False
+    )
+    from graphene_field_permission.apps import GrapheneFieldPermissionConfig
+
+    loader = Mock()
+    configure(loader=loader)
+    assert is_configured()
+    # a programmatic configure isn't overwritten from settings
+    GrapheneFieldPermissionConfig().ready()
+    assert get_permissions_method() is loader
+
+    reset()
+    assert not is_configured()
+    monkeypatch.setitem(sys.modules, 'django.conf', None)
+    with pytest.raises(Exception):
+        GrapheneFieldPermissionConfig().ready()
+
+
+def test_settings_providers():
+    assert DictSettings({'SRC_MODULE': 'fakemod'}).get_options() == {
+        'SRC_MODULE': 'fakemod',
+    }
+    environ = {
+        'GRAPHENE_FIELD_PERMISSION_SRC_MODULE': 'fakemod',
+        'GRAPHENE_FIELD_PERMISSION_SRC_METHOD': 'fakemethod',
+        'PATH': '/bin',
+    }
+    assert EnvironSettings(environ).get_options() == {
+        'SRC_MODULE': 'fakemod',
+        'SRC_METHOD': 'fakemethod',
+    }
+    with pytest.raises(NotImplementedError):
+        SettingsProvider().get_options()
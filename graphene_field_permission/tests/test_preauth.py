@@ -0,0 +1,320 @@
+import pytest
+from functools import partial
+from types import SimpleNamespace
+from unittest.mock import Mock
+from graphene_field_permission import api
+from graphene_field_permission.decorators import has_field_access
+from graphene_field_permission.engine import PermissionSet
+from graphene_field_permission.preauth import (
+    PlanCache,
+    PreAuthorizationMiddleware,
+    document_key,
+    get_field_access,
+    guarded_fields,
+    preauthorize,
+)
+
+
+@has_field_access('permission1')
+def resolve_name(data, info):
+    return data.name
+
+
+@has_field_access('permission4')
+def resolve_secret(data, info):
+    return data.secret
+
+
+@has_field_access('permission1', filter_field='group.id')
+def resolve_text(data, info):
+    return data.text
+
+
+def named(value):
+    return SimpleNamespace(value=value)
+
+
+def field_node(name, *selections, directives=()):
+    selection_set = None
+    if selections:
+        selection_set = SimpleNamespace(selections=list(selections))
+    return SimpleNamespace(
+        kind='field',
+        name=named(name),
+        selection_set=selection_set,
+        directives=list(directives),
+    )
+
+
+def directive(name, value):
+    if isinstance(value, bool):
+        value = SimpleNamespace(kind='boolean_value', value=value)
+    else:
+        value = SimpleNamespace(kind='variable', name=named(value))
+    argument = SimpleNamespace(name=named('if'), value=value)
+    return SimpleNamespace(name=named(name), arguments=[argument])
+
+
+def fragment_spread(name):
+    return SimpleNamespace(kind='fragment_spread', name=named(name))
+
+
+def inline_fragment(type_name, *selections):
+    return SimpleNamespace(
+        kind='inline_fragment',
+        type_condition=SimpleNamespace(name=named(type_name)),
+        selection_set=SimpleNamespace(selections=list(selections)),
+    )
+
+
+def operation(*selections, body=None):
+    loc = None
+    if body is not None:
+        loc = SimpleNamespace(source=SimpleNamespace(body=body))
+    return SimpleNamespace(
+        operation=named('query'),
+        name=None,
+        loc=loc,
+        selection_set=SimpleNamespace(selections=list(selections)),
+    )
+
+
+@pytest.fixture
+def schema():
+    group_type = SimpleNamespace(name='GroupNode', fields={
+        'name': SimpleNamespace(resolve=partial(resolve_name), type=None),
+        'secret': SimpleNamespace(resolve=resolve_secret, type=None),
+        'text': SimpleNamespace(resolve=resolve_text, type=None),
+        'id': SimpleNamespace(resolve=None, type=None),
+    })
+    list_type = SimpleNamespace(of_type=SimpleNamespace(of_type=group_type))
+    query_type = SimpleNamespace(name='Query', fields={
+        'groups': SimpleNamespace(resolve=None, type=list_type),
+    })
+    types = {'GroupNode': group_type, 'Query': query_type}
+    return SimpleNamespace(
+        query_type=query_type,
+        get_type=types.get,
+    )
+
+
+@pytest.fixture
+def info_context():
+    context = Mock(spec=[])
+    context.user = Mock(spec=['id', 'pk'], id=1, pk=1)
+    context.permissions = PermissionSet(['permission1'])
+    return context
+
+
+class TestPreauth:
+    def test_get_field_access(self):
+        assert get_field_access(resolve_name).requirement.permissions == (
+            'permission1',
+        )
+        assert get_field_access(partial(resolve_name)) is \
+            resolve_name.field_access
+        assert get_field_access(None) is None
+        assert get_field_access(lambda data, info: None) is None
+
+    def test_guarded_fields(self, schema):
+        document = operation(
+            field_node(
+                'groups',
+                field_node('id'),
+                field_node('name'),
+                field_node('__typename'),
+                fragment_spread('GroupFields'),
+                fragment_spread('GroupFields'),
+                inline_fragment('GroupNode', field_node('text')),
+            )
+        )
+        fragments = {'GroupFields': SimpleNamespace(
+            type_condition=SimpleNamespace(name=named('GroupNode')),
+            selection_set=SimpleNamespace(selections=[field_node('secret')]),
+        )}
+        guarded = guarded_fields(schema, document, fragments)
+        assert [(type_name, field) for type_name, field, _ in guarded] == [
+            ('GroupNode', 'name'),
+            ('GroupNode', 'secret'),
+            ('GroupNode', 'text'),
+        ]
+
+    def test_preauthorize(self, schema, info_context, monkeypatch):
+        document = operation(field_node(
+            'groups',
+            field_node('name'),
+            field_node('secret'),
+            field_node('text'),
+        ))
+        verdicts = preauthorize(schema, document, {}, info_context)
+        assert verdicts == {
+            ('GroupNode', 'name'): True,
+            ('GroupNode', 'secret'): False,
+            ('GroupNode', 'text'): None,
+        }
+
+        # resolvers read the recorded decisions
+        has_access = Mock(side_effect=AssertionError)
+        monkeypatch.setattr(api, '_has_access', has_access)
+        info = SimpleNamespace(context=info_context)
+        assert resolve_name(SimpleNamespace(name='foo'), info) == 'foo'
+        with pytest.raises(Exception, match="field 'secret'"):
+            resolve_secret(SimpleNamespace(secret='bar'), info)
+        assert not has_access.called
+
+    def test_middleware(self, schema, info_context):
+        middleware = PreAuthorizationMiddleware()
+        next = Mock(return_value='resolved')
+
+        def info_for(document, prev=None, variables=None):
+            return SimpleNamespace(
+                context=info_context,
+                schema=schema,
+                operation=document,
+                fragments={},
+                variable_values=variables or {},
+                path=SimpleNamespace(prev=prev),
+            )
+
+        allowed = operation(field_node('groups', field_node('name')))
+        assert middleware.resolve(next, None, info_for(allowed)) == 'resolved'
+        assert info_context.permission_verdicts == {
+            ('GroupNode', 'name'): True,
+        }
+
+        # every guarded field denied, rejected at the root fields
+        forbidden = operation(field_node('groups', field_node('secret')))
+        next.reset_mock()
+        with pytest.raises(Exception, match="fields 'secret'"):
+            middleware.resolve(next, None, info_for(forbidden))
+        with pytest.raises(Exception, match="fields 'secret'"):
+            middleware.resolve(next, None, info_for(forbidden))
+        assert not next.called
+
+        # readable fields alongside the denied ones keep the query
+        readable = operation(
+            field_node('groups', field_node('id'), field_node('secret'))
+        )
+        assert middleware.resolve(next, None, info_for(readable)) == \
+            'resolved'
+
+        # skipped fields don't count
+        skipped = operation(field_node(
+            'groups',
+            field_node('secret'),
+            field_node('id', directives=[directive('skip', True)]),
+        ))
+        with pytest.raises(Exception, match="fields 'secret'"):
+            middleware.resolve(next, None, info_for(skipped))
+        def included():
+            return operation(field_node(
+                'groups',
+                field_node('secret'),
+                field_node('name', directives=[directive('include', 'show')]),
+            ))
+
+        with pytest.raises(Exception, match="fields 'secret'"):
+            middleware.resolve(
+                next,
+                None,
+                info_for(included(), variables={'show': False})
+            )
+        assert middleware.resolve(
+            next,
+            None,
+            info_for(included(), variables={'show': True})
+        ) == 'resolved'
+
+        # filter_field requirements are checked per object, not rejected
+        mixed = operation(
+            field_node('groups', field_node('secret'), field_node('text'))
+        )
+        assert middleware.resolve(next, None, info_for(mixed)) == 'resolved'
+
+        middleware.reject_forbidden = False
+        assert middleware.resolve(
+            next,
+            None,
+            info_for(operation(field_node('groups', field_node('secret'))))
+        ) == 'resolved'
+
+    def test_document_key(self):
+        first = operation(body='{ groups { name } }')
+        assert document_key(first) == document_key(
+            operation(body='{ groups { name } }')
+        )
+        assert document_key(first) != document_key(
+            operation(body='{ groups { secret } }')
+        )
+        assert document_key(operation()) is None
+
+    def test_plan_cache(self, schema, monkeypatch):
+        plan_cache = PlanCache(max_entries=10)
+        has_access = Mock(wraps=api._has_access)
+        monkeypatch.setattr(api, '_has_access', has_access)
+
+        def request_context(permissions):
+            context = Mock(spec=[])
+            context.permissions = PermissionSet(permissions)
+            return context
+
+        def document():
+            # parsed again for every request
+            return operation(field_node(
+                'groups',
+                field_node('name'),
+                field_node('secret'),
+                field_node('text'),
+            ), body='{ groups { name secret text } }')
+
+        expected = {
+            ('GroupNode', 'name'): True,
+            ('GroupNode', 'secret'): False,
+            ('GroupNode', 'text'): None,
+        }
+        first = request_context(['permission1'])
+        assert preauthorize(
+            schema, document(), {}, first, plan_cache=plan_cache
+        ) == expected
+        assert has_access.call_count == 2
+
+        # same document and permissions reuse the plan
+        second = request_context(['permission1'])
+        assert preauthorize(
+            schema, document(), {}, second, plan_cache=plan_cache
+        ) == expected
+        assert has_access.call_count == 2
+        info = SimpleNamespace(context=second)
+        assert resolve_name(SimpleNamespace(name='foo'), info) == 'foo'
+        with pytest.raises(Exception, match="field 'secret'"):
+            resolve_secret(SimpleNamespace(secret='bar'), info)
+        assert has_access.call_count == 2
+
+        # plans keep verdicts only, the replayed denial is the request's own
+        # and doesn't carry the first user's permissions
+        plan = plan_cache.get(plan_cache.key(document(), second.permissions))
+        assert [allowed for _, _, _, allowed in plan] == [True, False, None]
+        with pytest.raises(api.AccessDenied) as exc:
+            api.check_field_access('permission4', info_context=second)
+        assert exc.value.relevant_permissions is None
+        assert str(exc.value) == "no match found on ('permission4',)"
+        assert exc.value is not api.get_decisions(first)[
+            (resolve_secret.field_access.requirement, None)
+        ]
+
+        # different permissions build a new plan
+        third = request_context(['permission1', 'permission4'])
+        assert preauthorize(
+            schema, document(), {}, third, plan_cache=plan_cache
+        )[('GroupNode', 'secret')] is True
+        assert has_access.call_count == 4
+
+        plan_cache.clear()
+        preauthorize(
+            schema,
+            document(),
+            {},
+            request_context(['permission1']),
+            plan_cache=plan_cache
+        )
+        assert has_access.call_count == 6
@@ -0,0 +1,189 @@
+import pytest
+import sys
+from types import SimpleNamespace
+from unittest.mock import Mock
+from graphene_field_permission import registry
+from graphene_field_permission.decorators import has_field_access
+from graphene_field_permission.querysets import (
+    FilterFieldHintsMixin,
+    QueryHints,
+    apply_filter_field_hints,
+    filter_field_hints,
+    hints_for_paths,
+)
+
+
+class DjangoObjectType:
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        return queryset
+
+
+@pytest.fixture
+def group_node():
+    registry.clear()
+
+    class GroupNode(FilterFieldHintsMixin, DjangoObjectType):
+        @has_field_access('permission1', filter_field='group_id')
+        def resolve_group_name(self, info):
+            return 'name'
+
+        @has_field_access('permission2',
+                          filter_field='group.division.corporation_id')
+        def resolve_group_description(self, info):
+            return 'description'
+
+        @has_field_access('permission3',
+                          filter_field='group.division.corporation_id')
+        def resolve_group_text(self, info):
+            return 'text'
+
+        @has_field_access('permission4')
+        def resolve_group_code(self, info):
+            return 'code'
+
+    yield GroupNode
+    registry.clear()
+
+
+class FieldDoesNotExist(Exception):
+    pass
+
+
+def model(**fields):
+    def get_field(name):
+        try:
+            return fields[name]
+        except KeyError:
+            raise FieldDoesNotExist(name)
+    return type('Model', (), {
+        '_meta': SimpleNamespace(get_field=get_field),
+    })
+
+
+def field(related_model=None, many_to_one=False, one_to_one=False,
+          one_to_many=False, many_to_many=False):
+    return SimpleNamespace(
+        related_model=related_model,
+        many_to_one=many_to_one,
+        one_to_one=one_to_one,
+        one_to_many=one_to_many,
+        many_to_many=many_to_many,
+    )
+
+
+@pytest.fixture
+def group_model(monkeypatch):
+    exceptions = Mock(spec=['FieldDoesNotExist'])
+    exceptions.FieldDoesNotExist = FieldDoesNotExist
+    monkeypatch.setitem(sys.modules, 'django.core.exceptions', exceptions)
+    division = model(id=field(), corporation_id=field())
+    group = model(
+        id=field(),
+        division=field(division, many_to_one=True),
+        members=field(model(id=field()), many_to_many=True),
+    )
+    return model(
+        id=field(),
+        group=field(group, many_to_one=True),
+        # get_field finds foreign keys by attname too
+        group_id=field(group, many_to_one=True),
+        profile=field(model(id=field()), one_to_one=True),
+        comments=field(model(id=field()), one_to_many=True),
+    )
+
+
+def queryset_mock():
+    queryset = Mock()
+    queryset.select_related.return_value = queryset
+    queryset.only.return_value = queryset
+    return queryset
+
+
+class TestQuerysets:
+    def test_hints_for_paths(self):
+        assert hints_for_paths(['group.division.corporation.id']) == \
+            QueryHints(
+                ('group__division__corporation',),
+                ('group__division__corporation__id',),
+            )
+        assert hints_for_paths([]) == QueryHints((), ())
+
+    def test_hints_for_paths_model(self, group_model):
+        assert hints_for_paths([
+            'group.division.corporation_id',
+            'profile.id',
+        ], group_model) == QueryHints(
+            ('group__division', 'profile'),
+            ('group__division__corporation_id', 'profile__id'),
+        )
+        # followed up to the first hop select_related can't take
+        assert hints_for_paths([
+            'group.members.id',
+            'group.display_name',
+            'comments.id',
+            'label',
+        ], group_model) == QueryHints(('group',), ('group',))
+        assert hints_for_paths(['group.members'], group_model) == \
+            QueryHints(('group',), ('group',))
+
+    def test_filter_field_hints(self, group_node):
+        assert registry.filter_fields('GroupNode') == (
+            'group_id',
+            'group.division.corporation_id',
+        )
+        assert filter_field_hints('GroupNode') == QueryHints(
+            ('group__division',),
+            ('group_id', 'group__division__corporation_id'),
+        )
+        assert filter_field_hints('Missing') == QueryHints((), ())
+
+    def test_apply_filter_field_hints(self, group_node):
+        queryset = queryset_mock()
+        assert apply_filter_field_hints(queryset, 'GroupNode') is queryset
+        queryset.select_related.assert_called_once_with('group__division')
+        queryset.only.assert_not_called()
+
+        apply_filter_field_hints(queryset, 'GroupNode', only=['name'])
+        queryset.only.assert_called_once_with(
+            'name',
+            'group_id',
+            'group__division__corporation_id',
+        )
+
+        # nothing to select
+        queryset = queryset_mock()
+        apply_filter_field_hints(queryset, 'Missing')
+        queryset.select_related.assert_not_called()
+
+    def test_mixin(self, group_node):
+        queryset = queryset_mock()
+        group_node.get_queryset(queryset, Mock())
+        queryset.select_related.assert_called_once_with('group__division')
+
+        group_node.filter_field_only = ['name']
+        group_node.get_queryset(queryset, Mock())
+        queryset.only.assert_called_once_with(
+            'name',
+            'group_id',
+            'group__division__corporation_id',
+        )
+
+    def test_mixin_model(self, group_node, group_model):
+        @has_field_access('permission5', filter_field='comments.author_id')
+        def resolve_group_comment(self, info):
+            return 'comment'
+
+        registry.register('GroupNode', 'group_comment',
+                          resolve_group_comment.field_access)
+        queryset = queryset_mock()
+        queryset.model = group_model
+        group_node.filter_field_only = ['name']
+        group_node.get_queryset(queryset, Mock())
+        # the reverse relation isn't selected, which would break every query
+        queryset.select_related.assert_called_once_with('group__division')
+        queryset.only.assert_called_once_with(
+            'name',
+            'group_id',
+            'group__division__corporation_id',
+        )
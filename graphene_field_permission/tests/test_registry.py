@@ -0,0 +1,144 @@
+import pytest
+from functools import partial
+from types import SimpleNamespace
+from unittest.mock import Mock
+from graphene_field_permission import registry
+from graphene_field_permission.api import restructure_permissions
+from graphene_field_permission.decorators import has_field_access
+from graphene_field_permission.lazy import LazyGroupPermissions
+from .fixtures import (
+    group_permission_data,
+    single_permission_data,
+)
+
+
+@pytest.fixture
+def schema_types():
+    registry.clear()
+
+    class GroupNode:
+        @has_field_access('permission1')
+        def resolve_group_name(self, info):
+            return 'name'
+
+        @has_field_access('Permission2', 'permission3')
+        def resolve_group_description(self, info):
+            return 'description'
+
+        @has_field_access('permission4', filter_field='group_id')
+        def resolve_group_text(self, info):
+            return 'text'
+
+    class DivisionNode:
+        @has_field_access('permission5')
+        def resolve_division_name(self, info):
+            return 'name'
+
+    yield GroupNode, DivisionNode
+    registry.clear()
+
+
+class TestRegistry:
+    def test_type_name_of(self):
+        def resolve_local(self, info):
+            pass
+
+        assert registry.type_name_of(resolve_local) is None
+        assert registry.type_name_of(
+            has_field_access.__call__
+        ) == 'has_field_access'
+
+    def test_register(self, schema_types):
+        assert len(registry.get_fields()) == 4
+        assert [
+            entry.field_name for entry in registry.get_fields('GroupNode')
+        ] == ['group_name', 'group_description', 'group_text']
+
+        entry = registry.get_field('GroupNode', 'group_description')
+        assert entry.type_name == 'GroupNode'
+        assert entry.requirement.permissions == ('permission2', 'permission3')
+        assert entry.filter_field is None
+        assert registry.get_field('GroupNode', 'group_text').filter_field == \
+            'group_id'
+        assert registry.get_field('GroupNode', 'missing') is None
+
+    def test_graphql_names(self, schema_types):
+        group_node, division_node = schema_types
+        # graphene's defaults until the schema is known
+        entry = registry.get_field('GroupNode', 'group_name')
+        assert entry.graphql_type_name == 'GroupNode'
+        assert entry.graphql_field_name == 'groupName'
+        assert registry.to_camel_case('group__name_2') == 'group_Name2'
+
+        # e.g. Meta.name = 'Group' and a field named explicitly
+        group_type = SimpleNamespace(fields={
+            'groupName': SimpleNamespace(
+                resolve=partial(group_node.resolve_group_name)
+            ),
+            'description': SimpleNamespace(
+                resolve=group_node.resolve_group_description
+            ),
+            'id': SimpleNamespace(resolve=None),
+        })
+        introspection_type = SimpleNamespace(fields={
+            'name': SimpleNamespace(resolve=None),
+        })
+        schema = SimpleNamespace(graphql_schema=SimpleNamespace(type_map={
+            'Group': group_type,
+            'Query': SimpleNamespace(fields={}),
+            'String': SimpleNamespace(),
+            '__Type': introspection_type,
+        }))
+        assert registry.use_schema(schema) == 2
+
+        entry = registry.get_field('Group', 'description')
+        assert entry is registry.get_field('GroupNode', 'group_description')
+        assert (entry.graphql_type_name, entry.graphql_field_name) == (
+            'Group',
+            'description',
+        )
+        assert [
+            entry.field_name for entry in registry.get_fields('Group')
+        ] == ['group_name', 'group_description']
+        # not in the schema, left at the defaults
+        assert registry.get_field('GroupNode', 'group_text') \
+            .graphql_type_name == 'GroupNode'
+
+        single = restructure_permissions(single_permission_data)
+        assert registry.visible_fields(single) == {
+            'GroupNode': {'group_name': True, 'group_description': True},
+        }
+        assert registry.visible_fields(single, graphql_names=True) == {
+            'Group': {'groupName': True, 'description': True},
+        }
+
+    def test_visible_fields(self, schema_types):
+        single = restructure_permissions(single_permission_data)
+        assert registry.visible_fields(single) == {
+            'GroupNode': {'group_name': True, 'group_description': True},
+        }
+        # cached per fingerprint
+        same = restructure_permissions(list(single_permission_data))
+        assert registry.visible_fields(same) is registry.visible_fields(single)
+
+        grouped = restructure_permissions(group_permission_data)
+        assert registry.visible_fields(grouped) == {
+            'GroupNode': {'group_text': None},
+        }
+        assert registry.visible_fields(restructure_permissions({})) == {}
+
+        # unloaded lazy groups might grant anything filtered
+        lazy = LazyGroupPermissions(Mock(), Mock())
+        assert registry.visible_fields(lazy) == {
+            'GroupNode': {'group_text': None},
+        }
+
+        # new registrations aren't hidden by cached projections
+        class CorporationNode:
+            @has_field_access('permission1')
+            def resolve_corporation_name(self, info):
+                return 'name'
+
+        assert registry.visible_fields(single)['CorporationNode'] == {
+            'corporation_name': True,
+        }
@@ -0,0 +1,90 @@
+import pytest
+from unittest.mock import Mock
+from graphene_field_permission import api
+from graphene_field_permission.api import (
+    check_field_access,
+    permissions_filter,
+    restructure_permissions,
+    set_scope_index,
+)
+from graphene_field_permission.scopes import ScopeIndex
+from .fixtures import info_context_mock
+
+
+@pytest.fixture
+def scope_index():
+    index = ScopeIndex({
+        'corporation-1': None,
+        'division-1': 'corporation-1',
+        'division-2': 'corporation-1',
+        'group-1': 'division-1',
+        'group-2': 'division-2',
+        3: 'division-2',
+    })
+    set_scope_index(index)
+    yield index
+    set_scope_index(None)
+
+
+class TestScopes:
+    def test_chain(self):
+        index = ScopeIndex.from_edges([
+            ('group-1', 'division-1'),
+            ('division-1', 'corporation-1'),
+        ])
+        assert index.chain('group-1') == (
+            'group-1',
+            'division-1',
+            'corporation-1',
+        )
+        assert index.chain('corporation-1') == ('corporation-1',)
+        assert index.chain('unknown') == ('unknown',)
+        assert len(index) == 3
+
+    def test_ids_are_strings(self):
+        index = ScopeIndex({1: 2, 2: None})
+        assert index.chain('1') == ('1', '2')
+
+    def test_cycle(self):
+        with pytest.raises(ValueError):
+            ScopeIndex({'a': 'b', 'b': 'c', 'c': 'a'})
+
+    def test_permissions_filter(self, scope_index):
+        permissions = restructure_permissions({
+            'corporation-1': ['corporation-admin'],
+            'division-2': ['division-editor'],
+            'group-2': ['group-viewer'],
+        })
+        # inherited from the corporation only
+        group_1 = permissions_filter(permissions, 'group-1')
+        assert group_1 is permissions['corporation-1']
+
+        # union of the group's own grants and its ancestors'
+        group_2 = permissions_filter(permissions, 'group-2')
+        assert set(group_2) == {
+            'corporation-admin',
+            'division-editor',
+            'group-viewer',
+        }
+        assert 'division-editor' in permissions_filter(permissions, '3')
+
+        with pytest.raises(ValueError):
+            permissions_filter(permissions, 'corporation-2')
+
+    def test_check_field_access(self, scope_index, info_context_mock,
+                                monkeypatch):
+        monkeypatch.setattr(
+            api,
+            'fetch_permissions',
+            Mock(return_value=restructure_permissions({
+                'corporation-1': ['permission1'],
+            }))
+        )
+        test_data = Mock()
+        test_data.group.id = 'group-2'
+        assert check_field_access(
+            'permission1',
+            filter_field='group.id',
+            filter_data=test_data,
+            info_context=info_context_mock,
+        ) is True
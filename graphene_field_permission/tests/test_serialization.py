@@ -0,0 +1,46 @@
+import pytest
+from unittest.mock import Mock
+from graphene_field_permission import serialization
+from graphene_field_permission.api import restructure_permissions
+from graphene_field_permission.lazy import LazyGroupPermissions
+from .fixtures import (
+    group_permission_data,
+    single_permission_data,
+)
+
+
+class TestSerialization:
+    def test_round_trip(self):
+        single = restructure_permissions(single_permission_data)
+        assert serialization.loads(serialization.dumps(single)) == single
+
+        grouped = restructure_permissions(group_permission_data)
+        data = serialization.dumps(grouped)
+        loaded = serialization.loads(memoryview(bytearray(data)))
+        assert loaded == grouped
+        assert 'permission4' in loaded['group-5678']
+
+        numbered = restructure_permissions({
+            1234: ['permission1'], -1: [], 'unicode-ü': ['permission-ü'],
+        })
+        assert serialization.loads(serialization.dumps(numbered)) == numbered
+        assert serialization.loads(serialization.dumps({})) == {}
+
+    def test_string_table(self):
+        grouped = restructure_permissions({
+            'group-{}'.format(i): ['a-shared-permission-name'] for i in range(50)
+        })
+        data = serialization.dumps(grouped)
+        assert data.count(b'a-shared-permission-name') == 1
+
+    def test_unsupported(self):
+        assert serialization.dumps(LazyGroupPermissions(Mock(), Mock())) is None
+        with pytest.raises(TypeError):
+            serialization.dumps(restructure_permissions({(1, 2): []}))
+
+    def test_invalid_data(self):
+        data = serialization.dumps(restructure_permissions(group_permission_data))
+        for invalid in (b'', b'not permissions', data[:-1],
+                        data[:4] + b'\x09' + data[5:]):
+            with pytest.raises(ValueError):
+                serialization.loads(invalid)
@@ -0,0 +1,46 @@
+import sys
+from unittest.mock import Mock
+from graphene_field_permission import versions
+from graphene_field_permission.signals import connect_permission_signals
+
+
+class TestSignals:
+    def test_connect_permission_signals(self, monkeypatch):
+        signals_mock = Mock(spec=['post_save', 'post_delete', 'm2m_changed'])
+        monkeypatch.setitem(sys.modules, 'django.db.models.signals', signals_mock)
+        monkeypatch.setattr(versions, 'bump_version', Mock())
+        monkeypatch.setattr(versions, 'bump_all', Mock())
+        permission_model = Mock()
+        user = Mock()
+
+        on_change = connect_permission_signals(
+            permission_model,
+            get_users=lambda instance, **kwargs: [instance.user],
+        )
+        signals_mock.post_save.connect.assert_called_once_with(
+            on_change, sender=permission_model, weak=False
+        )
+        signals_mock.post_delete.connect.assert_called_once_with(
+            on_change, sender=permission_model, weak=False
+        )
+        signals_mock.m2m_changed.connect.assert_called_once_with(
+            on_change, sender=permission_model, weak=False
+        )
+
+        on_change(permission_model, Mock(user=user), created=True)
+        versions.bump_version.assert_called_once_with(user)
+
+        # m2m pre_ actions are ignored
+        on_change(permission_model, Mock(user=user), action='pre_add')
+        assert versions.bump_version.call_count == 1
+        on_change(permission_model, Mock(user=user), action='post_add')
+        assert versions.bump_version.call_count == 2
+
+    def test_connect_permission_signals_all(self, monkeypatch):
+        signals_mock = Mock(spec=['post_save', 'post_delete', 'm2m_changed'])
+        monkeypatch.setitem(sys.modules, 'django.db.models.signals', signals_mock)
+        monkeypatch.setattr(versions, 'bump_all', Mock())
+
+        on_change = connect_permission_signals(Mock())
+        on_change(None, Mock())
+        versions.bump_all.assert_called_once_with()
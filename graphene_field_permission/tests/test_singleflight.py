@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from graphene_field_permission.metrics import InMemorySink, set_sink
+from graphene_field_permission.singleflight import SingleFlight
+
+
+@pytest.fixture
+def sink():
+    sink = InMemorySink()
+    set_sink(sink)
+    yield sink
+    set_sink(None)
+
+
+class TestSingleFlight:
+    def test_do(self, sink):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def load(value):
+            calls.append(value)
+            started.set()
+            release.wait(5)
+            return value
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = [executor.submit(flight.do, 'user', load, 1)]
+            started.wait(5)
+            # the rest arrive while the first load is in flight
+            results += [
+                executor.submit(flight.do, 'user', load, 2) for _ in range(4)
+            ]
+            while sink.counter('single_flight.waits') < 4:
+                time.sleep(0.001)
+            release.set()
+            assert [result.result() for result in results] == [1] * 5
+        assert calls == [1]
+        assert len(flight) == 0
+
+        # finished loads aren't kept
+        assert flight.do('user', load, 3) == 3
+
+    def test_do_error(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise ValueError('load failed')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(flight.do, 'user', fail)
+            started.wait(5)
+            second = executor.submit(flight.do, 'user', fail)
+            release.set()
+            errors = []
+            for result in (first, second):
+                with pytest.raises(ValueError, match='load failed') as exc:
+                    result.result()
+                errors.append(exc.value)
+        # waiters raise their own copy, chained to the load's
+        assert errors[1] is not errors[0]
+        assert errors[1].__cause__ is errors[0]
+
+        # the next caller retries
+        assert flight.do('user', lambda: 'loaded') == 'loaded'
+
+    def test_do_error_copy(self):
+        class LoadError(Exception):
+            def __init__(self, user, reason):
+                super().__init__(reason)
+                self.user = user
+
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise LoadError('user-1', 'load failed')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            executor.submit(flight.do, 'user', fail)
+            started.wait(5)
+            second = executor.submit(flight.do, 'user', fail)
+            release.set()
+            with pytest.raises(LoadError, match='load failed') as exc:
+                second.result()
+        assert exc.value.user == 'user-1'
+
+    def test_do_interrupted(self, sink):
+        class Interrupt(BaseException):
+            pass
+
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def interrupted():
+            started.set()
+            release.wait(5)
+            raise Interrupt()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(flight.do, 'user', interrupted)
+            started.wait(5)
+            second = executor.submit(flight.do, 'user', lambda: 'loaded')
+            while sink.counter('single_flight.waits') < 1:
+                time.sleep(0.001)
+            release.set()
+            with pytest.raises(Interrupt):
+                first.result()
+            # isn't raised in the waiter, which loads again itself
+            assert second.result() == 'loaded'
+
+    def test_do_timeout(self):
+        flight = SingleFlight(timeout=0.01)
+        started = threading.Event()
+        release = threading.Event()
+
+        def load():
+            started.set()
+            release.wait(5)
+            return 'loaded'
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            first = executor.submit(flight.do, 'user', load)
+            started.wait(5)
+            with pytest.raises(TimeoutError):
+                flight.do('user', load)
+            # other keys aren't held up
+            assert flight.do('other', lambda: 'other') == 'other'
+            release.set()
+            assert first.result() == 'loaded'
+
+    def test_do_async(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def load(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            if value == 'fail':
+                raise ValueError('load failed')
+            return value
+
+        async def run():
+            results = await asyncio.gather(*[
+                flight.do_async('user', load, value)
+                for value in ('first', 'second', 'third')
+            ])
+            assert results == ['first'] * 3
+
+            failures = await asyncio.gather(*[
+                flight.do_async('user', load, 'fail') for _ in range(2)
+            ], return_exceptions=True)
+            assert all(isinstance(e, ValueError) for e in failures)
+            assert failures[0] is not failures[1]
+
+            # a cancelled caller doesn't cancel the load for the others
+            first = asyncio.ensure_future(flight.do_async('user', load, 'a'))
+            second = asyncio.ensure_future(flight.do_async('user', load, 'b'))
+            await asyncio.sleep(0)
+            first.cancel()
+            assert await second == 'a'
+
+            with pytest.raises(TimeoutError):
+                await SingleFlight(timeout=0.001).do_async('user', load, 'c')
+
+        asyncio.run(run())
+        assert calls == ['first', 'fail', 'a', 'c']
+        assert len(flight) == 0
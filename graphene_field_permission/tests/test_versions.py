@@ -0,0 +1,26 @@
+from unittest.mock import Mock
+from graphene_field_permission import api, versions
+
+
+class TestVersions:
+    def test_bump_version(self, monkeypatch):
+        monkeypatch.setattr(api, 'permissions_cache', Mock())
+        user = Mock(spec=['pk'], pk='versions-user')
+        other = Mock(spec=['pk'], pk='versions-other')
+        version = versions.get_version(user)
+        other_version = versions.get_version(other)
+
+        versions.bump_version(user)
+        assert versions.get_version(user) != version
+        assert versions.get_version(other) == other_version
+        api.permissions_cache.invalidate.assert_called_once_with(user)
+
+    def test_bump_all(self, monkeypatch):
+        monkeypatch.setattr(api, 'permissions_cache', Mock())
+        user = Mock(spec=['pk'], pk='versions-user')
+        versions.bump_version(user)
+        version = versions.get_version(user)
+
+        versions.bump_all()
+        assert versions.get_version(user) != version
+        api.permissions_cache.invalidate_all.assert_called_once_with()
@@ -0,0 +1,37 @@
+import threading
+from . import api
+from .cache import user_key
+
+# Process-local version stamps for cached permissions. Caches store the
+# stamp current when permissions were loaded and reload once it changes.
+_generation = 0
+_versions = {}
+_lock = threading.Lock()
+
+
+def get_version(user):
+    return _generation, _versions.get(user_key(user), 0)
+
+
+def bump_version(user):
+    """
+    Marks a user's cached permissions stale and drops them from the
+    api permissions cache, if one is installed.
+    """
+    key = user_key(user)
+    with _lock:
+        _versions[key] = _versions.get(key, 0) + 1
+    if api.permissions_cache is not None:
+        api.permissions_cache.invalidate(user)
+
+
+def bump_all():
+    """
+    Marks every user's cached permissions stale.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        _versions.clear()
+    if api.permissions_cache is not None:
+        api.permissions_cache.invalidate_all()